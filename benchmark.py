@@ -0,0 +1,380 @@
+"""
+Benchmarks of the data pipeline and the app's hot paths
+
+Every benchmark runs in a fresh worker process, so the peak RSS reported is
+its own. Wall time is the median over --repeat runs; throughput is in the
+benchmark's own unit (extract rows, megapixels, maps, views). The pipeline
+benchmarks run on a synthetic TAB4824-shaped extract (synthetic_scb.py) at
+each --scale, 1 being the size of the real extract. Results can be saved as
+a JSON baseline, and later runs are compared against it:
+
+    python benchmark.py                            # everything, scale 0.05
+    python benchmark.py --only process --scale 1 5 20 --data-dir /data/bench
+    python benchmark.py --save                     # write benchmark_baseline.json
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+APP_DIR = ROOT / "sweden" / "app"
+BASELINE = ROOT / "benchmark_baseline.json"
+
+# Slower or faster than the baseline by more than this share is flagged
+TOLERANCE = 0.10
+
+# Views the app benchmarks step through: (view type, change metric, category)
+APP_VIEWS = [(view, metric, category)
+             for view, metric in [(0, None), (1, 0), (1, 1)]
+             for category in range(4)]
+
+# Map variants rendered by the render_maps benchmark
+RENDER_LANG = "en"
+RENDER_BACKGROUND = "white"
+
+
+def import_path(name, path):
+    """Import a module from a file that isn't on sys.path (e.g. a folder with a space)."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_extract(scale, data_dir):
+    """Path of the synthetic extract at `scale`, generated on first use."""
+    from synthetic_scb import write_extract
+
+    path = Path(data_dir) / f"TAB4824_x{scale:g}.csv"
+    if not path.exists():
+        print(f"  generating {path.name} ...", file=sys.stderr)
+        write_extract(path, scale)
+    return path
+
+
+# Each benchmark: setup(scale, workdir, data_dir) -> state, and
+# run(state) -> units of work done. run() may return (units, seconds) to
+# time only part of itself.
+
+def setup_process(scale, workdir, data_dir, use_cache=False):
+    sys.path.insert(0, str(APP_DIR))
+    import process_data
+    from synthetic_scb import row_count
+
+    source = synthetic_extract(scale, data_dir)
+    os.chdir(workdir)
+    state = {"module": process_data, "source": source, "rows": row_count(scale),
+             "use_cache": use_cache}
+    if use_cache:
+        run_process(state)  # builds the Parquet cache
+    return state
+
+
+def run_process(state):
+    state["module"].process_demographic_data(state["source"], use_cache=state["use_cache"],
+                                             cache_dir="cache")
+    return state["rows"]
+
+
+def setup_process_cached(scale, workdir, data_dir):
+    return setup_process(scale, workdir, data_dir, use_cache=True)
+
+
+def setup_clean_scb(scale, workdir, data_dir):
+    return import_path("clean_scb", ROOT / "sweden" / "raw" / "cleaning scripts" / "clean_scb.py")
+
+
+def run_clean_scb(clean_scb):
+    return len(clean_scb.clean_all())
+
+
+def setup_clean_statbank(scale, workdir, data_dir):
+    import clean_statbank
+    return clean_statbank
+
+
+def run_clean_statbank(clean_statbank):
+    return len(clean_statbank.clean_all())
+
+
+def setup_app_start(scale, workdir, data_dir):
+    sys.path.insert(0, str(APP_DIR))
+    import app_bundle
+    return app_bundle
+
+
+def run_app_start(app_bundle):
+    """The app's cold-start data path: read the bundle, rebuild the GeoJSON."""
+    table = app_bundle.load_bundle()
+    app_bundle.feature_collection(table)
+    return 1
+
+
+def setup_build_view(scale, workdir, data_dir, cached=False):
+    sys.path.insert(0, str(APP_DIR))
+    import rerun_timing
+    import streamlit.deprecation_util
+    from streamlit.testing.v1 import AppTest
+
+    # Deprecation notices on every rerun would drown the report. AppTest
+    # resets the log levels on each run, so the logger is switched off.
+    logging.getLogger(streamlit.deprecation_util.__name__).disabled = True
+    return {"AppTest": AppTest, "timing": rerun_timing, "cached": cached}
+
+
+def show_view(at, view, metric, category):
+    at.sidebar.radio[1].set_value(at.sidebar.radio[1].options[view]).run()
+    if metric is not None:
+        at.sidebar.radio[2].set_value(at.sidebar.radio[2].options[metric]).run()
+    selectbox = at.sidebar.selectbox[0]
+    selectbox.set_value(selectbox.options[category]).run()
+    assert not at.exception, at.exception
+
+
+def run_build_view(state):
+    """
+    build_view() of app.py while its reruns step through APP_VIEWS: the
+    misses, which build the figure, statistics and tables of a new view, or
+    with `cached` the hits, which serve a view from the view cache. Only
+    build_view's own stages of the app's rerun timings (rerun_timing.py)
+    count, not the rest of the AppTest reruns around them.
+    """
+    import streamlit as st
+
+    st.cache_resource.clear()
+    at = state["AppTest"].from_file(str(APP_DIR / "app.py"), default_timeout=120)
+    at.run()
+    if state["cached"]:
+        for view in APP_VIEWS:
+            show_view(at, *view)
+
+    session, first = at.session_state["timing_session"], at.session_state["timing_rerun"]
+    for view in APP_VIEWS:
+        show_view(at, *view)
+
+    seconds = []
+    for record in state["timing"].recent():
+        if record["session"] != session or record["rerun"] <= first:
+            continue
+        if record["stages"]["view"]["cached"] == state["cached"]:
+            seconds.append(sum(timing["ms"] for stage, timing in record["stages"].items()
+                               if stage == "view" or stage.startswith("view.")) / 1000)
+    assert seconds, "no build_view calls of that kind were timed"
+    return len(seconds), sum(seconds)
+
+
+def setup_build_view_cached(scale, workdir, data_dir):
+    return setup_build_view(scale, workdir, data_dir, cached=True)
+
+
+def setup_transparent(scale, workdir, data_dir):
+    from PIL import Image
+
+    make_transparent = import_path("make_transparent", ROOT / "images" / "make_transparent.py")
+    with Image.open(ROOT / "images" / "typology_map.png") as im:
+        image = im.copy()
+    return {"module": make_transparent, "image": image}
+
+
+def run_transparent(state):
+    state["module"].white_to_transparent(state["image"], threshold=240)
+    width, height = state["image"].size
+    return width * height / 1e6
+
+
+def setup_render_maps(scale, workdir, data_dir):
+    import render_maps
+    return {"module": render_maps, "root": workdir}
+
+
+def run_render_maps(state):
+    render_maps = state["module"]
+    manifest = render_maps.load_manifest()
+    tasks = [(i, lang, background) for i, lang, background in render_maps.variants(manifest)
+             if lang == RENDER_LANG and background == RENDER_BACKGROUND]
+    for task in tasks:
+        render_maps.render(*task, root=state["root"])
+    return len(tasks)
+
+
+BENCHMARKS = {
+    "process": {
+        "setup": setup_process, "run": run_process, "unit": "rows", "scaled": True,
+        "about": "process_demographic_data() on the synthetic extract, parsing the CSV",
+    },
+    "process_cached": {
+        "setup": setup_process_cached, "run": run_process, "unit": "rows", "scaled": True,
+        "about": "process_demographic_data() from the Parquet cache of the extract",
+    },
+    "clean_scb": {
+        "setup": setup_clean_scb, "run": run_clean_scb, "unit": "rows",
+        "about": "clean_scb.clean_all() on sweden/raw",
+    },
+    "clean_statbank": {
+        "setup": setup_clean_statbank, "run": run_clean_statbank, "unit": "rows",
+        "about": "clean_statbank.clean_all() on raw",
+    },
+    "app_start": {
+        "setup": setup_app_start, "run": run_app_start, "unit": "loads",
+        "about": "app.py's data loading: bundle and GeoJSON",
+    },
+    "build_view": {
+        "setup": setup_build_view, "run": run_build_view, "unit": "views",
+        "about": "app.py's build_view() misses: figure, statistics and tables of a new view",
+    },
+    "build_view_cached": {
+        "setup": setup_build_view_cached, "run": run_build_view, "unit": "views",
+        "about": "app.py's build_view() hits: views served from the view cache",
+    },
+    "transparent": {
+        "setup": setup_transparent, "run": run_transparent, "unit": "MP",
+        "about": "white_to_transparent() on a rendered map",
+    },
+    "render_maps": {
+        "setup": setup_render_maps, "run": run_render_maps, "unit": "maps",
+        "about": "render_maps.render() of every map in maps.json, one variant each",
+    },
+}
+
+
+def measure(name, scale, repeat, data_dir):
+    """Run one benchmark in this (worker) process and return its result."""
+    sys.path.insert(0, str(APP_DIR))
+    from rerun_timing import peak_rss_mb
+
+    spec = BENCHMARKS[name]
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    with tempfile.TemporaryDirectory() as workdir, \
+            contextlib.redirect_stdout(io.StringIO()):
+        cwd = os.getcwd()
+        try:
+            state = spec["setup"](scale, workdir, data_dir)
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = spec["run"](state)
+                elapsed = time.perf_counter() - start
+                units, elapsed = result if isinstance(result, tuple) else (result, elapsed)
+                times.append(elapsed)
+        finally:
+            os.chdir(cwd)
+
+    wall = statistics.median(times)
+    return {
+        "wall": wall,
+        "min": min(times),
+        "peak_rss_mb": peak_rss_mb(),
+        "throughput": units / wall if wall else float("inf"),
+        "unit": spec["unit"],
+        "repeat": repeat,
+    }
+
+
+def run_benchmarks(names, scales, repeat=3, data_dir=None):
+    """Results keyed "name" (or "name@scale" for the scaled benchmarks)."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(data_dir or tmp)
+        data_dir.mkdir(parents=True, exist_ok=True)
+        for name in names:
+            for scale in (scales if BENCHMARKS[name].get("scaled") else [None]):
+                key = name if scale is None else f"{name}@{scale:g}"
+                # A fresh process per benchmark: its own imports, caches and peak RSS
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                    results[key] = pool.submit(measure, name, scale, repeat, data_dir).result()
+                print_result(key, results[key])
+    return results
+
+
+def print_result(key, result, baseline=None):
+    peak = result["peak_rss_mb"]
+    peak = f"{peak:>8.0f} MB" if peak is not None else f"{'-':>11}"
+    line = (f"{key:<24} {result['wall'] * 1000:>10.1f} ms {peak} "
+            f"{result['throughput']:>14,.1f} {result['unit']}/s")
+    if baseline is not None:
+        ratio = result["wall"] / baseline["wall"]
+        flag = "slower" if ratio > 1 + TOLERANCE else "faster" if ratio < 1 - TOLERANCE else ""
+        line += f"   x{ratio:.2f} of baseline {flag}"
+    print(line, flush=True)
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "system": platform.platform(),
+    }
+
+
+def compare(results, baseline):
+    """Print every result next to the baseline's and return the keys that got slower."""
+    print(f"\nCompared with the baseline of {baseline.get('saved', '?')} "
+          f"(tolerance {TOLERANCE:.0%}):")
+    slower = []
+    for key, result in results.items():
+        base = baseline["results"].get(key)
+        print_result(key, result, base)
+        if base is not None and result["wall"] > base["wall"] * (1 + TOLERANCE):
+            slower.append(key)
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS), default=None,
+                        help="Only run these benchmarks")
+    parser.add_argument("--scale", nargs="*", type=float, default=[0.05],
+                        help="Extract sizes relative to TAB4824 for the pipeline benchmarks "
+                             "(default: 0.05)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Runs per benchmark; the median is reported (default: 3)")
+    parser.add_argument("--data-dir", type=Path, default=None,
+                        help="Keep the synthetic extracts here between runs "
+                             "(default: a temporary folder)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE,
+                        help="Baseline JSON (default: benchmark_baseline.json)")
+    parser.add_argument("--save", action="store_true",
+                        help="Save the results as the baseline")
+    parser.add_argument("--list", action="store_true", help="List the benchmarks")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, spec in BENCHMARKS.items():
+            print(f"{name:<18} {spec['about']}")
+        raise SystemExit(0)
+
+    names = args.only or list(BENCHMARKS)
+    print(f"{'benchmark':<24} {'wall':>13} {'peak RSS':>11} {'throughput':>20}")
+    results = run_benchmarks(names, args.scale, args.repeat, args.data_dir)
+
+    if args.save:
+        saved = {"saved": time.strftime("%Y-%m-%d %H:%M"), "environment": environment(),
+                 "results": results}
+        if args.baseline.exists():
+            # Keep the baseline's other benchmarks and scales
+            previous = json.loads(args.baseline.read_text())
+            saved["results"] = {**previous.get("results", {}), **results}
+        args.baseline.write_text(json.dumps(saved, indent=1) + "\n")
+        print(f"\nSaved baseline to {args.baseline}")
+    elif args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("environment") != environment():
+            print("\nNote: the baseline was recorded on a different machine or Python")
+        slower = compare(results, baseline)
+        if slower:
+            print(f"\n{len(slower)} slower than the baseline: {', '.join(slower)}")
+            raise SystemExit(1)
@@ -0,0 +1,221 @@
+"""
+Clean the wide Statistics Denmark (StatBank) exports in raw into one long, typed table
+
+StatBank's CSV export is a wide, multi-header layout: the first row holds
+blank cells over the label columns and one period per value column
+("2008Q3", ...), and each label column is only filled on the row where its
+value changes ("Total", then " ","Age, total", then one row per kommune).
+The exports are streamed row by row, carrying the current label of each
+column down, into the same long format as sweden/raw/scb_clean.csv (plus a
+quarter), keyed on the DST kommune code. Any pair of periods can then be
+compared without re-exporting and cleaning by hand:
+
+    python clean_statbank.py
+    python clean_statbank.py --change 2021Q3 2025Q3
+"""
+import argparse
+import csv
+import re
+from pathlib import Path
+
+import pandas as pd
+
+from municipalities import danish_index, loose_key, name_key, report_unmatched
+
+ROOT = Path(__file__).resolve().parent
+RAW_DIR = ROOT / "raw"
+OUTPUT = RAW_DIR / "statbank_clean.csv"
+
+# One entry per export. "labels" names the label columns left of the
+# region column, outermost first (e.g. citizenship, then age for FOLK1C).
+INPUTS = {
+    "population": {
+        "file": "kommuner 2008 2025.csv",
+        "labels": ["group", "age"],
+        "encoding": "utf-8",
+    },
+}
+
+# Region rows that are not kommuner: DST codes of the whole country and the regions
+OTHER_REGIONS = {
+    "All Denmark": (0, "land"),
+    "Hele landet": (0, "land"),
+    "Region Nordjylland": (81, "region"),
+    "Region Midtjylland": (82, "region"),
+    "Region Syddanmark": (83, "region"),
+    "Region Hovedstaden": (84, "region"),
+    "Region Sjælland": (85, "region"),
+}
+
+# Column types of the combined table
+DTYPES = {
+    "input": "category",
+    "kommun_code": "int16",
+    "kommun": "category",
+    "level": "category",
+    "group": "category",
+    "age": "category",
+    "period": "category",
+    "year": "int16",
+    "quarter": "int8",
+    "value": "float64",
+}
+
+# "2025Q3", "2025M12" or "2025"; months and years get quarter 0
+PERIOD = re.compile(r"^(\d{4})(?:Q([1-4]))?(?:M\d{2})?$")
+
+
+def parse_period(period):
+    """Year and quarter of a StatBank period label ("2025Q3" -> (2025, 3))."""
+    match = PERIOD.match(period.strip())
+    if match is None:
+        raise ValueError(f"Not a StatBank period: {period!r}")
+    return int(match.group(1)), int(match.group(2) or 0)
+
+
+def region_lookup(index=None):
+    """Function from a region label to (code, name, level), or None."""
+    index = index or danish_index()
+    others = {}
+    for name, (code, level) in OTHER_REGIONS.items():
+        others[name_key(name)] = others[loose_key(name)] = (code, name, level)
+
+    cache = {}
+
+    def lookup(label):
+        if label not in cache:
+            code = index.code_for(label)
+            if code is not None:
+                cache[label] = (code, index.name(code), "kommune")
+            else:
+                cache[label] = others.get(name_key(label)) or others.get(loose_key(label))
+        return cache[label]
+
+    return lookup
+
+
+def stream_export(path, labels, encoding="utf-8"):
+    """
+    Yield (label values, region, period, value) for every value cell of a
+    wide StatBank export, one row in memory at a time.
+    """
+    with open(path, encoding=encoding, errors="replace", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        width = next(i for i, cell in enumerate(header) if cell.strip())
+        if width != len(labels) + 1:
+            raise ValueError(f"{path.name}: {width} label columns, expected "
+                             f"{len(labels)} + region")
+        periods = [cell.strip() for cell in header[width:]]
+
+        current = [""] * width
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            # A filled label cell starts a new block and resets the inner labels
+            for i, cell in enumerate(row[:width]):
+                if cell.strip():
+                    current[i:] = [cell.strip()] + [""] * (width - i - 1)
+                    break
+            values = row[width:]
+            if not values:
+                continue  # heading row
+            for period, value in zip(periods, values):
+                yield current[:-1], current[-1], period, value
+
+
+def clean_input(name, spec, raw_dir=RAW_DIR, lookup=None):
+    """Read one export and return it in the combined long format."""
+    lookup = lookup or region_lookup()
+    labels = spec["labels"]
+    periods = {}
+    columns = {key: [] for key in ("kommun_code", "kommun", "level", "group", "age",
+                                   "period", "year", "quarter", "value")}
+    unmatched = set()
+
+    for label_values, region, period, value in stream_export(
+            raw_dir / spec["file"], labels, spec.get("encoding", "utf-8")):
+        match = lookup(region)
+        if match is None:
+            unmatched.add(region)
+            continue
+        if period not in periods:
+            periods[period] = parse_period(period)
+        dims = dict(zip(labels, label_values))
+        code, kommun, level = match
+        columns["kommun_code"].append(code)
+        columns["kommun"].append(kommun)
+        columns["level"].append(level)
+        columns["group"].append(dims.get("group", ""))
+        columns["age"].append(dims.get("age", ""))
+        columns["period"].append(period)
+        year, quarter = periods[period]
+        columns["year"].append(year)
+        columns["quarter"].append(quarter)
+        # StatBank marks missing values with ".." or "-"
+        columns["value"].append(value.strip())
+
+    report_unmatched(sorted(unmatched), f"regions in {spec['file']}")
+    clean = pd.DataFrame(columns)
+    clean["value"] = pd.to_numeric(clean["value"], errors="coerce")
+    clean.insert(0, "input", name)
+    return clean
+
+
+def clean_all(inputs=INPUTS, raw_dir=RAW_DIR):
+    """Clean every input and combine them into one typed table."""
+    lookup = region_lookup()
+    frames = [clean_input(name, spec, raw_dir, lookup) for name, spec in inputs.items()]
+    return pd.concat(frames, ignore_index=True).astype(DTYPES)
+
+
+def read_clean(path=OUTPUT):
+    """Load the combined table with its column types."""
+    return pd.read_csv(path, encoding="utf-8", dtype=DTYPES, keep_default_na=False,
+                       na_values={"value": [""]})
+
+
+def change_table(clean, start="2021Q3", end="2025Q3", inputs=("population",), group=None,
+                 age=None):
+    """
+    Change between two periods per kommune, one column per input, keyed on
+    the kommune code (the old hand-cleaned change_*.csv files, merged).
+    `group` and `age` pick one label of those columns; by default the rows
+    are summed over them.
+    """
+    subset = clean[clean["input"].isin(inputs) & (clean["level"] == "kommune")
+                   & clean["period"].isin([start, end])]
+    if group is not None:
+        subset = subset[subset["group"] == group]
+    if age is not None:
+        subset = subset[subset["age"] == age]
+    levels = subset.pivot_table(index=["kommun_code", "kommun"], columns=["input", "period"],
+                                values="value", aggfunc="sum", observed=True)
+    change = pd.DataFrame({name: levels[(name, end)] - levels[(name, start)] for name in inputs})
+    return change.reset_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--raw-dir", type=Path, default=RAW_DIR,
+                        help="Folder with the StatBank exports (default: raw)")
+    parser.add_argument("-o", "--output", type=Path, default=OUTPUT,
+                        help="Combined output CSV (default: raw/statbank_clean.csv)")
+    parser.add_argument("--only", nargs="*", choices=list(INPUTS), default=None,
+                        help="Only clean these inputs")
+    parser.add_argument("--change", nargs=2, metavar=("START", "END"), default=None,
+                        help="Also print the change per kommune between two periods")
+    args = parser.parse_args()
+
+    inputs = {name: INPUTS[name] for name in (args.only or INPUTS)}
+    clean = clean_all(inputs, args.raw_dir)
+    clean.to_csv(args.output, index=False, encoding="utf-8")
+
+    print(f"Processing complete! Created {args.output}")
+    for name, rows in clean.groupby("input", observed=True):
+        print(f"  {name}: {rows['kommun_code'].nunique()} regions, "
+              f"{rows['period'].nunique()} periods")
+
+    if args.change:
+        change = change_table(clean, *args.change, inputs=tuple(inputs))
+        print(change.to_string(index=False))
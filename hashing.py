@@ -0,0 +1,18 @@
+"""
+Content hashes of input files
+
+The caches of the Swedish pipeline (sweden/app/process_data.py's Parquet
+extracts) and of spatial.py (contiguity weights) are keyed on the SHA-256
+of the file they were built from, so an edited input is never read through
+a stale cache.
+"""
+import hashlib
+
+
+def file_hash(path, block_size=1 << 20):
+    """SHA-256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
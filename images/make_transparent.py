@@ -1,68 +1,103 @@
 #!/usr/bin/env python3
 import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+
+import numpy as np
 from PIL import Image
 
-def white_to_transparent(img: Image.Image, threshold: int = 240) -> Image.Image:
+def white_to_transparent(img: Image.Image, threshold: int = 240, soft: int = 0) -> Image.Image:
     """
     Convert near-white pixels to transparent.
     threshold: 0..255; higher means more aggressive (treats more light colors as white).
+    soft: width of an alpha ramp below the threshold. Pixels whose darkest channel
+    is within `soft` of the threshold fade out linearly instead of staying opaque.
+    0 (default) gives a hard cut.
     """
     # Ensure RGBA
     img = img.convert("RGBA")
-    pixels = img.getdata()
+    pixels = np.asarray(img)
+
+    # A pixel is "white-ish" when all channels are above threshold, i.e. when
+    # its darkest channel is
+    darkest = pixels[..., :3].min(axis=-1)
+    alpha = pixels[..., 3]
+
+    if soft > 0:
+        # Scale alpha by the distance below the threshold, 1 at threshold - soft
+        ramp = np.clip((threshold - darkest.astype(np.int32)) / soft, 0.0, 1.0)
+        new_alpha = np.rint(alpha * ramp).astype(np.uint8)
+    else:
+        # Already transparent pixels stay transparent either way
+        new_alpha = np.where(darkest >= threshold, 0, alpha).astype(np.uint8)
+
+    img.putalpha(Image.fromarray(new_alpha, "L"))
+    return img
 
-    new_pixels = []
-    for r, g, b, a in pixels:
-        if a == 0:
-            # Already transparent, keep it
-            new_pixels.append((r, g, b, a))
-            continue
+# Source hashes of the last run, kept in the output dir for --incremental hash
+MANIFEST_NAME = ".make_transparent.json"
 
-        # Mark pixel transparent if it's "white-ish" (all channels above threshold)
-        if r >= threshold and g >= threshold and b >= threshold:
-            new_pixels.append((r, g, b, 0))
-        else:
-            new_pixels.append((r, g, b, a))
+def output_path(src_path: Path, input_dir: Path, out_dir: Path, suffix: str, keep_subdirs: bool) -> Path:
+    # Always save as PNG to preserve transparency
+    out_name = f"{src_path.stem}{suffix}.png"
 
-    img.putdata(new_pixels)
-    return img
+    if keep_subdirs:
+        # Re-root under the provided input directory
+        return out_dir / src_path.parent.relative_to(input_dir) / out_name
+    return out_dir / out_name
 
-def process_file(src_path: Path, out_dir: Path, suffix: str, threshold: int, overwrite: bool, keep_subdirs: bool):
-    try:
-        with Image.open(src_path) as im:
-            out_img = white_to_transparent(im, threshold=threshold)
+def source_hash(src_path: Path, threshold: int, soft: int) -> str:
+    """Hash of the source image and the settings that affect the output."""
+    digest = hashlib.sha256(src_path.read_bytes())
+    digest.update(f"{threshold}:{soft}".encode())
+    return digest.hexdigest()
 
-            stem = src_path.stem
-            # Always save as PNG to preserve transparency
-            out_name = f"{stem}{suffix}.png"
+def process_file(src_path: Path, out_dir: Path, input_dir: Path, suffix: str, threshold: int, overwrite: bool,
+                 keep_subdirs: bool, soft: int = 0, incremental: str = None, known_hash: str = None):
+    """
+    Process one image. Returns a status message and, with incremental="hash",
+    the source hash to record in the manifest.
+    """
+    digest = None
+    try:
+        out_file = output_path(src_path, input_dir, out_dir, suffix, keep_subdirs)
+
+        if out_file.exists():
+            if incremental == "mtime" and out_file.stat().st_mtime >= src_path.stat().st_mtime:
+                return f"Skip (up to date): {out_file}", digest
+            if incremental == "hash":
+                digest = source_hash(src_path, threshold, soft)
+                if digest == known_hash:
+                    return f"Skip (unchanged): {out_file}", digest
+            if not overwrite and not incremental:
+                return f"Skip (exists): {out_file}", digest
+        elif incremental == "hash":
+            digest = source_hash(src_path, threshold, soft)
 
-            if keep_subdirs:
-                rel_parent = src_path.parent
-                # Re-root under the provided input directory
-                out_file = out_dir / rel_parent.relative_to(args.input_dir) / out_name
-            else:
-                out_file = out_dir / out_name
+        with Image.open(src_path) as im:
+            out_img = white_to_transparent(im, threshold=threshold, soft=soft)
 
             out_file.parent.mkdir(parents=True, exist_ok=True)
 
-            if out_file.exists() and not overwrite:
-                print(f"Skip (exists): {out_file}")
-                return
-
             save_params = {}
             # Preserve DPI if available
             if "dpi" in im.info:
                 save_params["dpi"] = im.info["dpi"]
 
             out_img.save(out_file, format="PNG", **save_params)
-            print(f"Saved: {out_file}")
+            return f"Saved: {out_file}", digest
     except Exception as e:
-        print(f"Error processing {src_path}: {e}")
+        return f"Error processing {src_path}: {e}", None
 
-def gather_images(input_dir: Path, recursive: bool, exts):
+def gather_images(input_dir: Path, recursive: bool, exts, suffix: str = None):
     pattern = "**/*" if recursive else "*"
     for p in input_dir.glob(pattern):
+        # Skip our own outputs when they live next to the sources
+        if suffix and p.stem.endswith(suffix):
+            continue
         if p.is_file() and p.suffix.lower().lstrip(".") in exts:
             yield p
 
@@ -81,10 +116,17 @@ if __name__ == "__main__":
                         help="Suffix for output filenames (default: _transparent)")
     parser.add_argument("-t", "--threshold", type=int, default=240,
                         help="0-255. Higher = more pixels become transparent (default: 240)")
+    parser.add_argument("--soft", type=int, default=0,
+                        help="Width of a soft alpha ramp below the threshold (default: 0, hard cut)")
     parser.add_argument("--ext", nargs="*", default=["png", "jpg", "jpeg", "webp"],
                         help="File extensions to process (default: png jpg jpeg webp)")
     parser.add_argument("--overwrite", action="store_true",
                         help="Overwrite existing files in the output directory")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of worker processes, 0 = one per CPU (default: 1)")
+    parser.add_argument("--incremental", choices=["mtime", "hash"], default=None,
+                        help="Only redo outputs that are older than their source (mtime) or whose "
+                             "source or settings changed since the last run (hash)")
 
     args = parser.parse_args()
     input_dir = args.input_dir.resolve()
@@ -93,19 +135,53 @@ if __name__ == "__main__":
     if not input_dir.exists():
         raise SystemExit(f"Input directory not found: {input_dir}")
 
-    images = list(gather_images(input_dir, args.recursive, set(e.lower() for e in args.ext)))
+    images = sorted(gather_images(input_dir, args.recursive, set(e.lower() for e in args.ext), args.suffix))
     if not images:
         print("No matching images found.")
         raise SystemExit(0)
 
-    for img_path in images:
-        process_file(
+    manifest_path = output_dir / MANIFEST_NAME
+    manifest = {}
+    if args.incremental == "hash" and manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+
+    tasks = [
+        dict(
             src_path=img_path,
             out_dir=output_dir,
+            input_dir=input_dir,
             suffix=args.suffix,
             threshold=args.threshold,
             overwrite=args.overwrite,
             keep_subdirs=args.keep_subdirs,
+            soft=args.soft,
+            incremental=args.incremental,
+            known_hash=manifest.get(str(img_path.relative_to(input_dir))),
         )
+        for img_path in images
+    ]
+
+    jobs = args.jobs or os.cpu_count()
+    if jobs > 1:
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        futures = [pool.submit(process_file, **task) for task in tasks]
+        # Report in input order, each as soon as it and those before it are done
+        results = (future.result() for future in futures)
+    else:
+        pool = None
+        results = (process_file(**task) for task in tasks)
+
+    try:
+        for task, (message, digest) in zip(tasks, results):
+            print(message)
+            if digest is not None:
+                manifest[str(task["src_path"].relative_to(input_dir))] = digest
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if args.incremental == "hash":
+        output_dir.mkdir(parents=True, exist_ok=True)
+        manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
 
     print("Done.")
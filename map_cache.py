@@ -0,0 +1,104 @@
+"""
+Matplotlib geometry cache for the choropleth maps
+
+GeoDataFrame.plot converts every shapely polygon to a matplotlib path on each
+call, which dominates the time to re-render a map. MapGeometry does that
+conversion once, for all features in one vectorised pass, and afterwards a
+map is drawn by handing the cached paths and a facecolour array to a
+PathCollection. Re-colouring an existing map for a new metric only swaps the
+facecolour array:
+
+    geometry = MapGeometry(gdf)
+    collection = geometry.draw(ax, colours_a)
+    geometry.recolour(collection, colours_b)
+"""
+import numpy as np
+import shapely
+from matplotlib.collections import PathCollection
+from matplotlib.colors import to_rgba_array
+from matplotlib.path import Path
+
+
+def geometry_paths(geometries):
+    """
+    One compound matplotlib Path per (multi)polygon, holes included, built
+    from flat coordinate arrays rather than polygon by polygon.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    parts, part_geom = shapely.get_parts(geometries, return_index=True)
+    rings, ring_part = shapely.get_rings(parts, return_index=True)
+    coords, coord_ring = shapely.get_coordinates(rings, return_index=True)
+
+    # Each ring starts with MOVETO and ends with CLOSEPOLY (its repeated first vertex)
+    codes = np.full(len(coords), Path.LINETO, dtype=Path.code_type)
+    starts = np.flatnonzero(np.r_[True, coord_ring[1:] != coord_ring[:-1]])
+    ends = np.r_[starts[1:], len(coords)] - 1
+    codes[starts] = Path.MOVETO
+    codes[ends] = Path.CLOSEPOLY
+
+    # Split the flat arrays at geometry boundaries
+    coord_geom = part_geom[ring_part[coord_ring]]
+    bounds = np.searchsorted(coord_geom, np.arange(len(geometries) + 1))
+    return [Path(coords[a:b], codes[a:b]) if b > a else Path(np.empty((0, 2)))
+            for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+class MapGeometry:
+    """
+    Cached matplotlib paths of a GeoDataFrame's polygons, in its row order.
+
+    Holds no matplotlib artists itself, so one instance serves any number of
+    figures (and can be built before forking render workers).
+    """
+
+    def __init__(self, gdf):
+        self.paths = geometry_paths(gdf.geometry.values)
+        self.bounds = gdf.total_bounds
+        self.geographic = gdf.crs is None or gdf.crs.is_geographic
+        self.index = gdf.index
+
+    def __len__(self):
+        return len(self.paths)
+
+    def collection(self, facecolors, edgecolor="none", linewidth=0.5, subset=None, **kwargs):
+        """A PathCollection of the cached paths (or the rows in boolean `subset`)."""
+        paths = self.paths
+        if subset is not None:
+            paths = [path for path, keep in zip(paths, subset) if keep]
+        return PathCollection(paths, facecolors=facecolors, edgecolors=edgecolor,
+                              linewidths=linewidth, **kwargs)
+
+    def draw(self, ax, facecolors, edgecolor="none", linewidth=0.5, missing=None,
+             missing_kwds=None):
+        """
+        Draw the polygons on `ax` in `facecolors` (one colour per row, or one
+        for all) and frame the axes the way GeoDataFrame.plot does.
+
+        Rows flagged in boolean `missing` are drawn again on top with
+        `missing_kwds` (e.g. a hatch), like GeoDataFrame.plot's missing_kwds.
+        Returns the main collection.
+        """
+        collection = self.collection(to_rgba_array(facecolors), edgecolor, linewidth)
+        ax.add_collection(collection, autolim=False)
+
+        if missing is not None and np.any(missing):
+            kwds = dict(missing_kwds or {})
+            kwds.pop("label", None)
+            colour = kwds.pop("color", "none")
+            ax.add_collection(self.collection(colour, edgecolor, linewidth, subset=missing, **kwds),
+                              autolim=False)
+
+        minx, miny, maxx, maxy = self.bounds
+        ax.update_datalim([(minx, miny), (maxx, maxy)])
+        ax.autoscale_view()
+        if self.geographic:
+            # Same correction as geopandas for lon/lat coordinates
+            ax.set_aspect(1 / np.cos(np.deg2rad((miny + maxy) / 2)))
+        else:
+            ax.set_aspect("equal")
+        return collection
+
+    @staticmethod
+    def recolour(collection, facecolors):
+        """Swap the facecolours of a drawn collection; no geometry work."""
+        collection.set_facecolor(to_rgba_array(facecolors))
@@ -0,0 +1,234 @@
+"""
+Canonical municipality index for the Swedish and Danish analyses
+
+Each index maps an integer municipality code to its name, the rows of its
+polygons in the country's GeoJSON and the aliases it appears under in the
+data (English names, older spellings, names whose letters were lost to an
+encoding round trip). Data loaders attach codes through the index and join
+on them instead of on stripped names, and get told which rows did not match.
+"""
+import json
+import re
+import unicodedata
+import warnings
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent
+SWEDISH_GEOJSON = ROOT / "sweden" / "app" / "swedish_municipalities.geojson"
+DANISH_GEOJSON = ROOT / "raw" / "cleaned_kommune_copenhagen.geojson"
+
+# Swedish län (SCB two-digit codes). Kommun codes start with their län code.
+SWEDISH_LAN = {
+    1: "Stockholms län", 3: "Uppsala län", 4: "Södermanlands län",
+    5: "Östergötlands län", 6: "Jönköpings län", 7: "Kronobergs län",
+    8: "Kalmar län", 9: "Gotlands län", 10: "Blekinge län", 12: "Skåne län",
+    13: "Hallands län", 14: "Västra Götalands län", 17: "Värmlands län",
+    18: "Örebro län", 19: "Västmanlands län", 20: "Dalarnas län",
+    21: "Gävleborgs län", 22: "Västernorrlands län", 23: "Jämtlands län",
+    24: "Västerbottens län", 25: "Norrbottens län",
+}
+
+# Danish kommuner (Danmarks Statistik codes) and official names
+DANISH_KOMMUNER = {
+    101: "København", 147: "Frederiksberg", 151: "Ballerup", 153: "Brøndby",
+    155: "Dragør", 157: "Gentofte", 159: "Gladsaxe", 161: "Glostrup",
+    163: "Herlev", 165: "Albertslund", 167: "Hvidovre", 169: "Høje-Taastrup",
+    173: "Lyngby-Taarbæk", 175: "Rødovre", 183: "Ishøj", 185: "Tårnby",
+    187: "Vallensbæk", 190: "Furesø", 201: "Allerød", 210: "Fredensborg",
+    217: "Helsingør", 219: "Hillerød", 223: "Hørsholm", 230: "Rudersdal",
+    240: "Egedal", 250: "Frederikssund", 253: "Greve", 259: "Køge",
+    260: "Halsnæs", 265: "Roskilde", 269: "Solrød", 270: "Gribskov",
+    306: "Odsherred", 316: "Holbæk", 320: "Faxe", 326: "Kalundborg",
+    329: "Ringsted", 330: "Slagelse", 336: "Stevns", 340: "Sorø",
+    350: "Lejre", 360: "Lolland", 370: "Næstved", 376: "Guldborgsund",
+    390: "Vordingborg", 400: "Bornholm", 410: "Middelfart", 411: "Christiansø",
+    420: "Assens", 430: "Faaborg-Midtfyn", 440: "Kerteminde", 450: "Nyborg",
+    461: "Odense", 479: "Svendborg", 480: "Nordfyns", 482: "Langeland",
+    492: "Ærø", 510: "Haderslev", 530: "Billund", 540: "Sønderborg",
+    550: "Tønder", 561: "Esbjerg", 563: "Fanø", 573: "Varde", 575: "Vejen",
+    580: "Aabenraa", 607: "Fredericia", 615: "Horsens", 621: "Kolding",
+    630: "Vejle", 657: "Herning", 661: "Holstebro", 665: "Lemvig",
+    671: "Struer", 706: "Syddjurs", 707: "Norddjurs", 710: "Favrskov",
+    727: "Odder", 730: "Randers", 740: "Silkeborg", 741: "Samsø",
+    746: "Skanderborg", 751: "Aarhus", 756: "Ikast-Brande",
+    760: "Ringkøbing-Skjern", 766: "Hedensted", 773: "Morsø", 779: "Skive",
+    787: "Thisted", 791: "Viborg", 810: "Brønderslev", 813: "Frederikshavn",
+    820: "Vesthimmerlands", 825: "Læsø", 840: "Rebild", 846: "Mariagerfjord",
+    849: "Jammerbugt", 851: "Aalborg", 860: "Hjørring",
+}
+
+# Other names the Danish kommuner go by in our data and geometry
+DANISH_ALIASES = {
+    101: ["Copenhagen", "Københavns"],
+    751: ["Århus"],
+    810: ["Brønderslev-Dronninglund"],
+    820: ["Vesthimmerland"],
+    480: ["Nordfyn"],
+}
+
+
+def name_key(name):
+    """Exact lookup key: Unicode-normalised, case-folded, single-spaced."""
+    name = unicodedata.normalize("NFC", str(name)).casefold()
+    return re.sub(r"\s+", " ", name).strip()
+
+
+def loose_key(name):
+    """
+    Fallback lookup key with every non-ASCII letter replaced by "?", so that
+    "Dragør" matches "Drag�r" from an export that lost its encoding.
+    """
+    return re.sub(r"[^\x00-\x7f]", "?", name_key(name))
+
+
+class MunicipalityIndex:
+    """
+    Code -> name, level, geometry rows and aliases for one country.
+
+    `table` is indexed by integer code with columns `name`, `level` and
+    `rows` (positions of the municipality's features in the GeoJSON).
+    """
+
+    def __init__(self, table, aliases=None):
+        self.table = table
+        keys = {}
+        for code, name in table["name"].items():
+            keys.setdefault(name_key(name), code)
+        for code, names in (aliases or {}).items():
+            for name in names:
+                keys.setdefault(name_key(name), code)
+        self._keys = keys
+
+        # Loose keys only resolve names they identify uniquely
+        loose = {}
+        for key, code in keys.items():
+            loose.setdefault(loose_key(key), set()).add(code)
+        self._loose = {key: codes.pop() for key, codes in loose.items() if len(codes) == 1}
+
+    def __len__(self):
+        return len(self.table)
+
+    def codes(self, level=None):
+        """All codes, or the codes at one `level` ("kommun", "lan")."""
+        if level is None:
+            return self.table.index
+        return self.table.index[self.table["level"] == level]
+
+    def name(self, code):
+        return self.table.at[code, "name"]
+
+    def geometry_rows(self, code):
+        return self.table.at[code, "rows"]
+
+    def code_for(self, name):
+        """Code for a name or alias, or None if it isn't known."""
+        key = name_key(name)
+        if key in self._keys:
+            return self._keys[key]
+        return self._loose.get(loose_key(key))
+
+    def codes_for(self, names):
+        """Codes for a Series of names, looked up once per distinct name."""
+        lookup = {name: self.code_for(name) for name in pd.unique(names)}
+        return pd.Series(names, copy=False).map(lookup).astype("Int64")
+
+    def attach_codes(self, df, name_col, code_col="kommun_code", label=None):
+        """Return `df` with a `code_col` column of codes for `name_col`, reporting misses."""
+        df = df.assign(**{code_col: self.codes_for(df[name_col]).to_numpy()})
+        report_unmatched(df.loc[df[code_col].isna(), name_col], label or f"{name_col} names")
+        return df
+
+    def join(self, left, right, on="kommun_code", how="left", label="data"):
+        """
+        Merge `right` onto `left` on integer codes, reporting rows of `right`
+        with no match in `left` and (for a left join) rows of `left` that
+        received no data.
+        """
+        unmatched = right.loc[~right[on].isin(left[on]), on]
+        report_unmatched([self._describe(code) for code in unmatched], f"{label} rows")
+        if how == "left":
+            missing = left.loc[~left[on].isin(right[on]), on]
+            report_unmatched([self._describe(code) for code in missing], f"rows without {label}")
+        return left.merge(right, on=on, how=how)
+
+    def merge(self, left, right, left_on, right_on=None, how="left", label="data"):
+        """
+        Drop-in for a merge on name columns: codes are attached to both sides
+        through the index and the join is done on them. Name columns of
+        `right` that `left` already has are dropped, as a merge `on` them would.
+        """
+        right_on = right_on or left_on
+        left = self.attach_codes(left, left_on)
+        right = self.attach_codes(right, right_on, label=f"{label} names")
+        right = right.drop(columns=[col for col in right.columns
+                                    if col in left.columns and col != "kommun_code"])
+        return self.join(left, right, how=how, label=label)
+
+    def _describe(self, code):
+        return f"{self.name(code)} ({code})" if code in self.table.index else code
+
+
+def report_unmatched(values, label):
+    """Warn about values (names or codes) that did not match the index."""
+    values = pd.Series(values, dtype=object).dropna().unique()
+    if len(values):
+        shown = ", ".join(map(str, values[:10])) + (" ..." if len(values) > 10 else "")
+        warnings.warn(f"{len(values)} unmatched {label}: {shown}", stacklevel=3)
+
+
+def _feature_rows(features, key):
+    rows = {}
+    for i, feature in enumerate(features):
+        rows.setdefault(key(feature["properties"]), []).append(i)
+    return rows
+
+
+@lru_cache(maxsize=None)
+def swedish_index(geojson_path=SWEDISH_GEOJSON):
+    """
+    Index of the 290 Swedish kommuner (codes from the GeoJSON `id`, e.g.
+    "0114" -> 114) and the 21 län, which have no polygons of their own.
+    """
+    with open(geojson_path, encoding="utf-8") as f:
+        features = json.load(f)["features"]
+
+    rows = _feature_rows(features, lambda props: int(props["id"]))
+    names = {int(f["properties"]["id"]): f["properties"]["kom_namn"].strip() for f in features}
+
+    table = pd.DataFrame(
+        [(code, name, "kommun", tuple(rows[code])) for code, name in names.items()]
+        + [(code, name, "lan", ()) for code, name in SWEDISH_LAN.items()],
+        columns=["code", "name", "level", "rows"],
+    ).set_index("code").sort_index()
+    return MunicipalityIndex(table)
+
+
+@lru_cache(maxsize=None)
+def danish_index(geojson_path=DANISH_GEOJSON):
+    """
+    Index of the Danish kommuner. The GeoJSON only carries names, so its
+    features are matched to codes through the names and aliases.
+    """
+    table = pd.DataFrame(
+        [(code, name, "kommun", ()) for code, name in DANISH_KOMMUNER.items()],
+        columns=["code", "name", "level", "rows"],
+    ).set_index("code").sort_index()
+    index = MunicipalityIndex(table, DANISH_ALIASES)
+
+    with open(geojson_path, encoding="utf-8") as f:
+        features = json.load(f)["features"]
+    rows = _feature_rows(features, lambda props: index.code_for(props["label_dk"]))
+    report_unmatched([f["properties"]["label_dk"] for f in features
+                      if index.code_for(f["properties"]["label_dk"]) is None],
+                     "GeoJSON features")
+    table["rows"] = [tuple(rows.get(code, ())) for code in table.index]
+    return index
+
+
+def scb_region_code(region):
+    """Numeric code of an SCB region label ("0114 Upplands Väsby" -> 114)."""
+    match = re.match(r"^(\d+)\s", str(region))
+    return int(match.group(1)) if match else None
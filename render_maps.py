@@ -0,0 +1,253 @@
+"""
+Render the choropleth maps of the notebooks without running the notebooks
+
+Every map is described once in maps.json (data, titles per language,
+backgrounds). Geometry is read, joined to kommune codes and converted to
+matplotlib paths (map_cache.py) once per country and process, and every
+(map x language x background) variant is drawn from those paths with its
+own colours, in parallel if asked. Transparent variants are saved with a
+transparent background directly, so no make_transparent.py pass is needed.
+
+    python render_maps.py                     # everything in maps.json
+    python render_maps.py --country se -j 0   # Swedish maps, one worker per CPU
+    python render_maps.py --only typology_map --dry-run
+"""
+import argparse
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")  # headless: files only, no windows
+
+import geopandas as gpd
+import matplotlib.patches as mpatches
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from matplotlib.colors import LinearSegmentedColormap, SymLogNorm, to_rgba
+
+from map_cache import MapGeometry
+from typology import COUNTRIES, LABELS_DA, SMALL, TYPOLOGY, TYPOLOGY_COLOURS, classify_codes
+from typology_sweep import INDEXES, load_changes, read_change_file
+
+ROOT = Path(__file__).resolve().parent
+MANIFEST = ROOT / "maps.json"
+
+DPI = 220
+EDGE_COLOUR = "#888888"
+MISSING_COLOUR = "#f0f0f0"
+CREDIT_COLOUR = "#191C1B"
+
+# Linear zone of the SymLogNorm around 0, in people
+LINTHRESH = 500
+
+# Typology labels per language; English ones come from COUNTRIES
+TYPOLOGY_LABELS = {"da": LABELS_DA}
+
+
+def build_colormap():
+    """Colour-blind friendly diverging map, brown (loss) to blue (gain)"""
+    colors = [
+        (0.0,  "#6B3F02"),  # orangey brown (large loss)
+        (0.25, "#F9D35A"),  # light yellow
+        (0.5,  "#CCD6D3"),  # white at zero
+        (0.75, "#86D0E0"),  # light blue
+        (1.0,  "#002C39"),  # dark blue (large gain)
+    ]
+    return LinearSegmentedColormap.from_list("yellow_white_purple", colors, N=256)
+
+
+def symlog_norm(values, linthresh=LINTHRESH):
+    """Log-like scale with a linear zone around 0, symmetric about 0"""
+    bound = max(abs(values.min()), abs(values.max())) or 1.0
+    return SymLogNorm(linthresh=linthresh, linscale=1, vmin=-bound, vmax=bound)
+
+
+@lru_cache(maxsize=None)
+def load_manifest(path=MANIFEST):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def load_geometry(country, manifest_path=MANIFEST):
+    """
+    The country's polygons with a `kommun_code` column, read, joined to the
+    index and (if the manifest names a CRS) projected once per process.
+    """
+    spec = load_manifest(manifest_path)["countries"][country]
+    gdf = gpd.read_file(ROOT / spec["geojson"])
+    gdf["kommun_code"] = INDEXES[country]().codes_for(gdf[COUNTRIES[country]["geo_name"]]).to_numpy()
+    if spec.get("crs"):
+        gdf = gdf.to_crs(spec["crs"])
+    return gdf
+
+
+@lru_cache(maxsize=None)
+def load_map_geometry(country, manifest_path=MANIFEST):
+    """Matplotlib paths of the country's polygons, converted once per process"""
+    return MapGeometry(load_geometry(country, manifest_path))
+
+
+@lru_cache(maxsize=None)
+def change_values(path, country):
+    """Change per kommune code from a (name, change) CSV"""
+    return read_change_file(ROOT / path, country)
+
+
+@lru_cache(maxsize=None)
+def typology_keys(country, small=SMALL):
+    """Typology key per kommune code"""
+    changes = load_changes(country)
+    columns = COUNTRIES[country]
+    codes = classify_codes(changes[columns["total"]], changes[columns["native"]],
+                           changes[columns["foreign"]], small)
+    return pd.Series(np.array(TYPOLOGY)[codes], index=changes.index)
+
+
+def output_path(manifest, spec, lang, background, root=ROOT):
+    """images/<name>[_<lang>][_transparent].png, English without a suffix"""
+    out_dir = Path(root) / manifest["countries"][spec["country"]]["output_dir"]
+    name = spec["name"]
+    if lang != "en":
+        name += f"_{lang}"
+    if background == "transparent":
+        name += "_transparent"
+    return out_dir / f"{name}.png"
+
+
+def variants(manifest, only=None, country=None):
+    """(map index, language, background) of every output in the manifest"""
+    jobs = []
+    for i, spec in enumerate(manifest["maps"]):
+        if only and spec["name"] not in only:
+            continue
+        if country and spec["country"] != country:
+            continue
+        for lang in spec["text"]:
+            for background in spec.get("backgrounds", ["white"]):
+                jobs.append((i, lang, background))
+    return jobs
+
+
+def plot_change(ax, fig, gdf, geometry, spec, text):
+    values = gdf["kommun_code"].map(change_values(spec["data"], spec["country"]))
+    norm = symlog_norm(values.dropna())
+    cmap = build_colormap()
+
+    missing = values.isna().to_numpy()
+    colours = cmap(norm(values.fillna(0).to_numpy()))
+    colours[missing] = to_rgba(MISSING_COLOUR)
+    geometry.draw(ax, colours, EDGE_COLOUR, 0.5, missing=missing, missing_kwds={"hatch": "///"})
+    sm = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
+    sm.set_array([])
+    cbar = fig.colorbar(sm, ax=ax, fraction=0.025, pad=0.02)
+    cbar.set_label(text["colorbar"])
+
+
+def plot_typology(ax, gdf, geometry, spec, text, lang, transparent):
+    country = spec["country"]
+    keys = gdf["kommun_code"].map(typology_keys(country))
+    colours = keys.map(TYPOLOGY_COLOURS).fillna(MISSING_COLOUR)
+    geometry.draw(ax, colours.tolist(), EDGE_COLOUR, 0.5)
+
+    labels = TYPOLOGY_LABELS.get(lang, COUNTRIES[country]["labels"])
+    legend = dict(spec["legend"])
+    order, fontsize = legend.pop("order"), legend.pop("fontsize", 9)
+    patches = [mpatches.Patch(color=TYPOLOGY_COLOURS[key], label=labels[key]) for key in order]
+    leg = ax.legend(handles=patches, title=text["legend"], frameon=True, fontsize=fontsize, **legend)
+    if transparent:
+        leg.get_frame().set_facecolor("none")
+
+
+def render(map_index, lang, background, manifest_path=MANIFEST, root=ROOT):
+    """Render one variant and return its path"""
+    manifest = load_manifest(manifest_path)
+    spec = manifest["maps"][map_index]
+    text = spec["text"][lang]
+    transparent = background == "transparent"
+    gdf = load_geometry(spec["country"], manifest_path)
+    geometry = load_map_geometry(spec["country"], manifest_path)
+
+    fig, ax = plt.subplots(figsize=spec.get("figsize", [8.5, 10]))
+    if spec["kind"] == "change":
+        plot_change(ax, fig, gdf, geometry, spec, text)
+    else:
+        plot_typology(ax, gdf, geometry, spec, text, lang, transparent)
+    ax.set_axis_off()
+    ax.set_title(text["title"], pad=spec.get("title_pad"))
+    if text.get("credit"):
+        fig.text(0.5, spec.get("credit_y", 0.2), text["credit"], ha="center", va="center",
+                 fontsize=spec.get("credit_size", 11), color=CREDIT_COLOUR, alpha=0.8)
+
+    if "bottom" in spec:
+        fig.subplots_adjust(bottom=spec["bottom"])  # room for a legend below the map
+    else:
+        fig.tight_layout()
+
+    path = output_path(manifest, spec, lang, background, root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(path, dpi=DPI, transparent=transparent, bbox_inches=spec.get("bbox_inches"))
+    plt.close(fig)
+    return path
+
+
+def render_all(manifest_path=MANIFEST, only=None, country=None, jobs=1, root=ROOT):
+    """Render every selected variant, with `jobs` worker processes"""
+    manifest = load_manifest(manifest_path)
+    tasks = variants(manifest, only, country)
+
+    # Geometry and data are read here once, and the workers are forked so
+    # they inherit them. Without fork (Windows) each worker reads them again
+    # on first use.
+    for i in sorted({i for i, _, _ in tasks}):
+        spec = manifest["maps"][i]
+        load_map_geometry(spec["country"], manifest_path)
+        if spec["kind"] == "change":
+            change_values(spec["data"], spec["country"])
+        else:
+            typology_keys(spec["country"])
+
+    if jobs > 1 and len(tasks) > 1:
+        fork = "fork" in multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if fork else None)
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+            futures = [pool.submit(render, *task, manifest_path, root) for task in tasks]
+            for future in futures:
+                print(f"Saved {future.result()}")
+    else:
+        for task in tasks:
+            print(f"Saved {render(*task, manifest_path, root)}")
+    return len(tasks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--manifest", type=Path, default=MANIFEST,
+                        help="Map manifest (default: maps.json)")
+    parser.add_argument("--only", nargs="*", default=None, metavar="NAME",
+                        help="Only render these maps, e.g. typology_map")
+    parser.add_argument("--country", choices=list(COUNTRIES), default=None,
+                        help="Only render this country's maps")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of worker processes, 0 = one per CPU (default: 1)")
+    parser.add_argument("-o", "--output-root", type=Path, default=ROOT,
+                        help="Directory the manifest's output_dirs are relative to (default: repo root)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="List the files that would be written")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        manifest = load_manifest(args.manifest)
+        for i, lang, background in variants(manifest, args.only, args.country):
+            print(output_path(manifest, manifest["maps"][i], lang, background, args.output_root))
+        raise SystemExit(0)
+
+    count = render_all(args.manifest, args.only, args.country, args.jobs or os.cpu_count(),
+                       args.output_root)
+    print(f"Rendered {count} maps")
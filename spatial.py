@@ -0,0 +1,384 @@
+"""
+Spatial clustering of the kommune metrics: global Moran's I and local LISA
+
+Do the typology classes and the change in foreign background cluster
+geographically? Neighbours are kommuner whose polygons touch (queen
+contiguity, or within --tolerance degrees). Finding them is the only
+geometric step, so it is done once per GeoJSON: the neighbour pairs are
+cached in cache/ under the GeoJSON's SHA-256 and the tolerance, and later
+runs only read them.
+
+The statistics use the row-standardised weights as a sparse matrix and are
+computed for every metric at once: each metric is a column of one
+kommune x metric array, and each batch of random permutations is a single
+sparse product. Significance comes from permutations as in PySAL's esda
+(conditional permutations for the local statistic), so a Swedish run over
+every metric and year takes seconds:
+
+    python spatial.py se
+    python spatial.py dk --permutations 9999 --alpha 0.01
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import shapely
+from scipy import sparse
+from shapely.geometry import shape
+
+from hashing import file_hash
+from municipalities import (DANISH_GEOJSON, SWEDISH_GEOJSON, danish_index, report_unmatched,
+                            swedish_index)
+from typology import COUNTRIES, TYPOLOGY, classify_codes
+from typology_sweep import load_changes
+
+ROOT = Path(__file__).resolve().parent
+CACHE_DIR = ROOT / "cache"
+
+APP_DIR = ROOT / "sweden" / "app"
+SE_DEMOGRAPHICS = APP_DIR / "processed_demographics.csv"
+SE_YEARS = APP_DIR / "demographic_years.npz"
+DK_FOREIGN_SHARE = ROOT / "raw" / "merged_change_and_foreign_share.csv"
+
+INDEXES = {"se": swedish_index, "dk": danish_index}
+GEOJSONS = {"se": SWEDISH_GEOJSON, "dk": DANISH_GEOJSON}
+
+CATEGORIES = ["born_overseas", "both_parents_overseas", "one_parent_overseas",
+              "both_parents_sweden"]
+
+PERMUTATIONS = 999
+ALPHA = 0.05
+
+# Permutations drawn per batch; bounds memory at any --permutations
+BATCH = 250
+
+# LISA quadrants (as numbered by esda) and the label of each cluster type
+QUADRANTS = {1: "High-High", 2: "Low-High", 3: "Low-Low", 4: "High-Low"}
+NOT_SIGNIFICANT = "Not significant"
+ISOLATED = "No neighbours"
+
+
+class SpatialWeights:
+    """
+    Contiguity between kommuner: `codes` in row order and `pairs`, the
+    (i, j) row positions of each pair of neighbours with i < j.
+    """
+
+    def __init__(self, codes, pairs):
+        self.codes = np.asarray(codes, dtype=np.int64)
+        self.pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        self.cardinalities = np.bincount(self.pairs.ravel(), minlength=len(self.codes))
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def islands(self):
+        """Codes of kommuner without neighbours."""
+        return self.codes[self.cardinalities == 0]
+
+    def matrix(self):
+        """Row-standardised weights as a sparse CSR array; islands are empty rows."""
+        rows = np.r_[self.pairs[:, 0], self.pairs[:, 1]]
+        cols = np.r_[self.pairs[:, 1], self.pairs[:, 0]]
+        weights = 1.0 / self.cardinalities[rows]
+        return sparse.csr_array((weights, (rows, cols)), shape=(len(self), len(self)))
+
+    def align(self, codes):
+        """Weights between `codes` only, in that order (every code must be known)."""
+        positions = pd.Index(self.codes).get_indexer(codes)
+        if (positions < 0).any():
+            raise KeyError(f"Codes without geometry: {list(np.asarray(codes)[positions < 0])}")
+        new_row = np.full(len(self), -1)
+        new_row[positions] = np.arange(len(positions))
+        pairs = new_row[self.pairs]
+        pairs = np.sort(pairs[(pairs >= 0).all(axis=1)], axis=1)
+        return SpatialWeights(codes, pairs)
+
+    def save(self, path, **metadata):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(path, codes=self.codes, pairs=self.pairs,
+                            metadata=json.dumps(metadata))
+
+    @classmethod
+    def load(cls, path):
+        """The weights stored in `path` and the metadata saved with them."""
+        with np.load(path) as stored:
+            return cls(stored["codes"], stored["pairs"]), json.loads(str(stored["metadata"]))
+
+
+def build_weights(index, geojson_path, tolerance=0.0):
+    """
+    Contiguity of the kommuner in `index` from their polygons. Kommuner made
+    of several features (islands) neighbour anything any of them touches.
+    """
+    with open(geojson_path, encoding="utf-8") as f:
+        features = json.load(f)["features"]
+    geometries = np.array([shape(feature["geometry"]) for feature in features])
+
+    # Candidate pairs from the bounding-box tree, then the exact predicate
+    tree = shapely.STRtree(geometries)
+    if tolerance > 0:
+        left, right = tree.query(geometries, predicate="dwithin", distance=tolerance)
+    else:
+        left, right = tree.query(geometries, predicate="intersects")
+
+    codes = index.codes("kommun")
+    feature_row = np.full(len(features), -1)
+    for row, code in enumerate(codes):
+        feature_row[list(index.geometry_rows(code))] = row
+    pairs = np.column_stack([feature_row[left], feature_row[right]])
+    pairs = pairs[(pairs >= 0).all(axis=1) & (pairs[:, 0] < pairs[:, 1])]
+    return SpatialWeights(codes, np.unique(pairs, axis=0))
+
+
+def contiguity_weights(country, tolerance=0.0, cache_dir=CACHE_DIR):
+    """
+    The country's contiguity weights, read from the cache when it was built
+    from the same GeoJSON with the same tolerance, built and cached if not.
+    """
+    geojson_path = GEOJSONS[country]
+    digest = file_hash(geojson_path)
+    cache_path = (Path(cache_dir) /
+                  f"{Path(geojson_path).stem}-{digest[:16]}-tol{tolerance:g}.weights.npz")
+    if cache_path.exists():
+        weights, metadata = SpatialWeights.load(cache_path)
+        if metadata.get("tolerance") == tolerance:
+            return weights
+
+    start = time.perf_counter()
+    weights = build_weights(INDEXES[country](), geojson_path, tolerance)
+    weights.save(cache_path, source=Path(geojson_path).name, sha256=digest, tolerance=tolerance)
+    print(f"Built contiguity weights of {len(weights)} kommuner ({len(weights.pairs)} pairs) "
+          f"in {time.perf_counter() - start:.2f} s, cached as {cache_path}")
+    return weights
+
+
+def pseudo_p_values(observed, simulated):
+    """
+    Share of permutations at least as extreme as `observed`, in the tail it
+    falls in (esda's folded p_sim). `simulated` has permutations on axis 0.
+    """
+    larger = (simulated >= observed).sum(axis=0)
+    larger = np.minimum(larger, len(simulated) - larger)
+    return (larger + 1.0) / (len(simulated) + 1.0)
+
+
+def global_moran(weights, values, permutations=PERMUTATIONS, seed=0):
+    """
+    Global Moran's I of every column of `values` (kommuner x metrics, in
+    the row order of `weights`), with permutation inference.
+
+    Returns a dict of arrays with one entry per metric: I, the expected
+    value under no autocorrelation, the z-score and pseudo p-value from the
+    permutations.
+    """
+    W = weights.matrix()
+    z = values - values.mean(axis=0)
+    n, k = z.shape
+    s0 = W.sum()
+    sum_squares = (z * z).sum(axis=0)
+    observed = n / s0 * (z * (W @ z)).sum(axis=0) / sum_squares
+
+    rng = np.random.default_rng(seed)
+    simulated = np.empty((permutations, k))
+    for start in range(0, permutations, BATCH):
+        batch = min(BATCH, permutations - start)
+        order = rng.permuted(np.tile(np.arange(n), (batch, 1)), axis=1)
+        # Every permutation of every metric side by side: one sparse product
+        shuffled = z[order].transpose(1, 0, 2).reshape(n, batch * k)
+        products = (shuffled * (W @ shuffled)).sum(axis=0).reshape(batch, k)
+        simulated[start:start + batch] = n / s0 * products / sum_squares
+
+    return {
+        "I": observed,
+        "expected": np.full(k, -1.0 / (n - 1)),
+        "z_sim": (observed - simulated.mean(axis=0)) / simulated.std(axis=0),
+        "p_sim": pseudo_p_values(observed, simulated),
+    }
+
+
+def local_moran(weights, values, permutations=PERMUTATIONS, seed=0):
+    """
+    Local Moran's I (LISA) of every kommune and column of `values`.
+
+    Each kommune's value is held fixed while its neighbours are drawn at
+    random from the other kommuner. All kommuner share the draws of a
+    permutation, so a batch is one gather of (kommuner x permutations x
+    neighbours). Returns a dict of kommuner x metrics arrays: I, the
+    quadrant (QUADRANTS, 0 for islands) and the pseudo p-value (NaN for
+    islands).
+    """
+    W = weights.matrix()
+    z = values - values.mean(axis=0)
+    n, k = z.shape
+    m2 = (z * z).sum(axis=0) / n
+    lag = W @ z
+    observed = z * lag / m2
+
+    cardinality = weights.cardinalities
+    depth = max(int(cardinality.max()), 1)
+    # Draw positions among the n - 1 other kommuner, then skip over kommune i
+    skip = np.arange(n)[:, np.newaxis, np.newaxis]
+    take = np.arange(depth) < cardinality[:, np.newaxis, np.newaxis]
+    scale = np.where(cardinality > 0, 1.0 / np.maximum(cardinality, 1), 0.0)[:, np.newaxis]
+
+    rng = np.random.default_rng(seed)
+    larger = np.zeros((n, k))
+    for start in range(0, permutations, BATCH):
+        batch = min(BATCH, permutations - start)
+        draws = rng.random((batch, n - 1)).argsort(axis=1)[:, :depth]
+        neighbours = draws[np.newaxis] + (draws[np.newaxis] >= skip)
+        for col in range(k):
+            lags = (z[neighbours, col] * take).sum(axis=2) * scale
+            simulated = z[:, [col]] * lags / m2[col]
+            larger[:, col] += (simulated >= observed[:, [col]]).sum(axis=1)
+
+    larger = np.minimum(larger, permutations - larger)
+    p_sim = (larger + 1.0) / (permutations + 1.0)
+    isolated = cardinality == 0
+    p_sim[isolated] = np.nan
+
+    quadrant = np.select([(z > 0) & (lag > 0), (z < 0) & (lag > 0), (z < 0) & (lag < 0),
+                          (z > 0) & (lag < 0)], [1, 2, 3, 4], default=0)
+    quadrant[isolated] = 0
+    return {"I": observed, "quadrant": quadrant, "p_sim": p_sim}
+
+
+def typology_indicators(changes, country):
+    """One 0/1 column per typology class ("typology:decline") of the change table."""
+    columns = COUNTRIES[country]
+    codes = classify_codes(*(changes[columns[key]].to_numpy(dtype=float)
+                             for key in ("total", "native", "foreign")))
+    return pd.DataFrame({f"typology:{key}": (codes == i).astype(float)
+                         for i, key in enumerate(TYPOLOGY)}, index=changes.index)
+
+
+def swedish_metrics(demographics=SE_DEMOGRAPHICS, years_file=SE_YEARS):
+    """
+    Kommun code x metric table: each category's share in 2014 and 2024, its
+    change in points and relative change, its share in every year of the
+    year store (when present), the typology changes and typology classes.
+    """
+    df = pd.read_csv(demographics).set_index("kommun_code")
+    df = df[df.index.isin(swedish_index().codes("kommun"))]
+    metrics = {}
+    for cat in CATEGORIES:
+        metrics[f"pct_2014_{cat}"] = df[f"pct_2014_{cat}"]
+        metrics[f"pct_2024_{cat}"] = df[f"pct_2024_{cat}"]
+        metrics[f"change_pp_{cat}"] = df[f"pct_2024_{cat}"] - df[f"pct_2014_{cat}"]
+        metrics[f"change_relative_{cat}"] = df[f"change_relative_{cat}"]
+    table = pd.DataFrame(metrics)
+
+    if Path(years_file).exists():
+        with np.load(years_file) as store:
+            counts, codes = store["counts"], store["codes"]
+            categories, years = store["categories"].tolist(), store["years"].tolist()
+        shares = counts / counts.sum(axis=1, keepdims=True) * 100
+        table = table.join(pd.DataFrame({
+            f"pct_{year}_{cat}": shares[:, i, j]
+            for i, cat in enumerate(categories) for j, year in enumerate(years)
+            if f"pct_{year}_{cat}" not in table
+        }, index=codes))
+
+    changes = load_changes("se")
+    changes = changes[["Total", "Swedish", "Foreign National"]].join(typology_indicators(changes, "se"))
+    return table.join(changes, how="outer")
+
+
+def danish_metrics(foreign_share=DK_FOREIGN_SHARE):
+    """Kommune code x metric table: typology changes, foreign share, typology classes."""
+    changes = load_changes("dk")
+    share = pd.read_csv(foreign_share, encoding="utf-8-sig")
+    share = danish_index().attach_codes(share, "Kommune", label=Path(foreign_share).name)
+    share = share.dropna(subset=["kommun_code"]).set_index("kommun_code")
+    table = changes[["Total", "Danish", "Foreign National"]]
+    table = table.join(share.filter(like="pct_foreign"), how="outer")
+    return table.join(typology_indicators(changes, "dk"))
+
+
+METRICS = {"se": swedish_metrics, "dk": danish_metrics}
+
+
+def clustering(country, permutations=PERMUTATIONS, alpha=ALPHA, tolerance=0.0, seed=0):
+    """
+    Global and local statistics of every metric of the country.
+
+    Returns the global table (one row per metric) and the long local table
+    (one row per kommune and metric, with its LISA cluster at `alpha`).
+    """
+    index = INDEXES[country]()
+    table = METRICS[country]()
+    table.index = table.index.astype(int)
+
+    # Kommuner missing a metric are left out of every metric, so that one
+    # set of weights serves the whole batch
+    incomplete = table.isna().any(axis=1)
+    report_unmatched([f"{index.name(code)} ({code})" for code in table.index[incomplete]],
+                     "kommuner with missing metrics (left out)")
+    table = table[~incomplete]
+    constant = table.columns[table.nunique() <= 1]
+    if len(constant):
+        print(f"Skipping metrics without variation: {', '.join(constant)}")
+        table = table.drop(columns=constant)
+
+    weights = contiguity_weights(country, tolerance).align(table.index)
+    values = table.to_numpy(dtype=float)
+
+    start = time.perf_counter()
+    moran = global_moran(weights, values, permutations, seed)
+    lisa = local_moran(weights, values, permutations, seed)
+    elapsed = time.perf_counter() - start
+    print(f"Moran's I and LISA of {values.shape[1]} metrics over {len(weights)} kommuner, "
+          f"{permutations} permutations each, in {elapsed:.2f} s")
+
+    global_table = pd.DataFrame(moran, index=pd.Index(table.columns, name="metric"))
+    global_table["kommuner"] = len(weights)
+    global_table["islands"] = len(weights.islands)
+
+    labels = np.array([ISOLATED] + list(QUADRANTS.values()), dtype=object)
+    cluster = labels[lisa["quadrant"]]
+    cluster[(lisa["p_sim"] > alpha) & (lisa["quadrant"] > 0)] = NOT_SIGNIFICANT
+    local_table = pd.DataFrame({
+        "kommun_code": np.repeat(table.index, values.shape[1]),
+        "kommun": np.repeat([index.name(code) for code in table.index], values.shape[1]),
+        "metric": np.tile(table.columns, len(table)),
+        "value": values.ravel(),
+        "I": lisa["I"].ravel(),
+        "p_sim": lisa["p_sim"].ravel(),
+        "cluster": cluster.ravel(),
+    })
+    return global_table, local_table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("country", choices=list(COUNTRIES))
+    parser.add_argument("--permutations", type=int, default=PERMUTATIONS,
+                        help="Random permutations for the p-values (default: %(default)s)")
+    parser.add_argument("--alpha", type=float, default=ALPHA,
+                        help="Significance level of the LISA clusters (default: %(default)s)")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="Also count polygons this many degrees apart as neighbours "
+                             "(default: touching only)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output-dir", type=Path, default=Path("."),
+                        help="Where to write the CSVs (default: current directory)")
+    args = parser.parse_args()
+
+    global_table, local_table = clustering(args.country, args.permutations, args.alpha,
+                                           args.tolerance, args.seed)
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    global_path = args.output_dir / f"spatial_global_{args.country}.csv"
+    local_path = args.output_dir / f"spatial_local_{args.country}.csv"
+    global_table.to_csv(global_path, encoding="utf-8")
+    local_table.to_csv(local_path, index=False, encoding="utf-8")
+    print(f"Saved {global_path} and {local_path}")
+
+    print("\nGlobal Moran's I:")
+    print(global_table.sort_values("I", ascending=False).round(4).to_string())
@@ -0,0 +1,100 @@
+"""
+Fixed-layout file of counts by single year of age, sex and category
+
+process_data.py keeps the age detail that the app's working-age tables sum
+away in `demographic_ages.bin`: one block per year, back to back, each a
+C-ordered (region x age x sex x category) array of little-endian int32.
+Regions are riket, the län and the kommuner, in ascending code order. The
+years, codes and labels of the axes are in `demographic_ages.json`.
+
+Opening the file memory-maps it without reading anything; the age pyramid
+of one region in one year is then a single contiguous slice of the file
+(about 3 KB), so a drill-down reads only that from disk. A new year is
+appended as one more block.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+
+APP_DIR = Path(__file__).parent
+AGES_FILE = APP_DIR / "demographic_ages.bin"
+AGES_INDEX_FILE = APP_DIR / "demographic_ages.json"
+
+DTYPE = "<i4"
+
+# Single years of age; SCB's "100+ år" is age 100
+AGES = list(range(101))
+SEXES = ["män", "kvinnor"]
+
+
+def rollup_rows(codes, block):
+    """
+    Riket, län and kommun rows of a (kommun x ...) block, in ascending code
+    order, with the län (first two digits of the code) and riket summed
+    from the kommuner.
+    """
+    codes = np.asarray(codes)
+    lan_codes, lan_idx = np.unique(codes // 100, return_inverse=True)
+    lan = np.zeros((len(lan_codes),) + block.shape[1:], dtype=block.dtype)
+    np.add.at(lan, lan_idx, block)
+    riket = block.sum(axis=0, keepdims=True)
+
+    all_codes = np.concatenate([[0], lan_codes, codes])
+    rows = np.concatenate([riket, lan, block])
+    order = np.argsort(all_codes, kind="stable")
+    return all_codes[order], rows[order]
+
+
+def write_age_pyramids(codes, blocks, categories, path=AGES_FILE, index_path=AGES_INDEX_FILE,
+                       append=False):
+    """
+    Write `blocks` ({year: kommun x age x sex x category counts}, kommuner
+    in `codes` order) with their rollups, or add them after the years
+    already in the file with append=True.
+    """
+    region_codes = rollup_rows(codes, next(iter(blocks.values())))[0].tolist()
+    index = {"dtype": DTYPE, "codes": region_codes, "years": [], "ages": AGES,
+             "sexes": SEXES, "categories": list(categories)}
+    if append:
+        index = read_index(index_path)
+        if index["codes"] != region_codes or index["categories"] != list(categories):
+            raise ValueError(f"{path} has other regions or categories; rebuild it")
+
+    with open(path, "ab" if append else "wb") as f:
+        for year in sorted(blocks):
+            rollup_rows(codes, blocks[year])[1].astype(DTYPE).tofile(f)
+            index["years"].append(int(year))
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+
+    print(f"{'Appended' if append else 'Saved'} age pyramids of {len(region_codes)} regions "
+          f"for {sorted(int(year) for year in blocks)} to {path}")
+
+
+def read_index(index_path=AGES_INDEX_FILE):
+    with open(index_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def open_age_pyramids(path=AGES_FILE, index_path=AGES_INDEX_FILE):
+    """
+    The index of the file with `counts`, a read-only memory map of shape
+    (year, region, age, sex, category), and `rows`, the region row of each
+    code. None when the file hasn't been written.
+    """
+    if not Path(index_path).exists():
+        return None
+    index = read_index(index_path)
+    shape = (len(index["years"]), len(index["codes"]), len(index["ages"]),
+             len(index["sexes"]), len(index["categories"]))
+    return {
+        **index,
+        "rows": {code: row for row, code in enumerate(index["codes"])},
+        "counts": np.memmap(path, dtype=index["dtype"], mode="r", shape=shape),
+    }
+
+
+def age_pyramid(pyramids, code, year):
+    """(age x sex x category) counts of one region in one year, read from disk."""
+    return np.array(pyramids["counts"][pyramids["years"].index(year), pyramids["rows"][code]])
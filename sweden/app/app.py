@@ -4,12 +4,19 @@ Shows working age (18-67) population by background
 """
 import streamlit as st
 import pandas as pd
-import geopandas as gpd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-import json
+import threading
+import time
+import uuid
 from pathlib import Path
 
+import rerun_timing
+from age_pyramids import age_pyramid, open_age_pyramids
+from app_bundle import feature_collection, load_bundle
+from translations import TRANSLATIONS
+
 # Page config
 st.set_page_config(
     page_title="Swedish Demographic Change Explorer",
@@ -17,115 +24,95 @@ st.set_page_config(
     layout="wide"
 )
 
+# Time this rerun stage by stage (rerun_timing.py); the record is written to
+# rerun_timings.jsonl at the end of the script
+st.session_state.setdefault("timing_session", uuid.uuid4().hex[:12])
+st.session_state["timing_rerun"] = st.session_state.get("timing_rerun", 0) + 1
+timer = rerun_timing.start(st.session_state["timing_session"], st.session_state["timing_rerun"])
+
 # Get the directory where this script is located
 APP_DIR = Path(__file__).parent
 
-# Load data
-@st.cache_data
+# Initial map view
+MAP_CENTER = {"lat": 62.5, "lon": 16}
+MAP_ZOOM = 3.5
+
+# Every year of the age band, written by process_data.py
+YEARS_FILE = APP_DIR / "demographic_years.npz"
+
+# Seconds per year when the time series plays
+FRAME_SECONDS = 0.8
+
+# Colours of the 4 categories in the age pyramid
+PYRAMID_COLOURS = ["#0B6A55", "#36B0CC", "#B58A21", "#A3AFAB"]
+
+# Most recently used sidebar states whose figure, statistics and tables are
+# kept in memory for all sessions
+VIEW_CACHE_ENTRIES = 256
+
+# Load data. Cached as a resource so every session and rerun shares the same
+# objects instead of receiving a fresh copy; the app never modifies them.
+@st.cache_resource
 def load_data():
-    """Load processed demographic data and geodata"""
-    df = pd.read_csv(APP_DIR / "processed_demographics.csv")
-    gdf = gpd.read_file(APP_DIR / "swedish_municipalities.geojson")
-
-    # Merge on kommun name
-    gdf['kom_namn'] = gdf['kom_namn'].str.strip()
-    df['kommun'] = df['kommun'].str.strip()
-
-    merged = gdf.merge(df, left_on='kom_namn', right_on='kommun', how='left')
-
-    return df, gdf, merged
-
-df, gdf, merged_gdf = load_data()
-
-# Language translations
-TRANSLATIONS = {
-    "en": {
-        "title": "🇸🇪 Swedish Demographic Change Explorer",
-        "settings": "Settings",
-        "language": "Language",
-        "view_type": "View Type",
-        "snapshot": "Current Snapshot (2024)",
-        "change": "Change Over Time (2014-2024)",
-        "born_overseas": "Born overseas",
-        "both_parents_overseas": "Both parents born overseas (born in Sweden)",
-        "one_parent_overseas": "One parent born overseas (born in Sweden)",
-        "both_parents_sweden": "Both parents born in Sweden",
-        "show_aggregated": "Show aggregated view",
-        "aggregated_categories": "**Aggregated categories:**",
-        "select_categories": "Select categories to combine",
-        "select_category": "Select demographic category",
-        "error_select_one": "Please select at least one category",
-        "foreign_background": "Foreign background",
-        "change_metric": "Change metric",
-        "percentage_points": "Percentage points",
-        "relative_change": "Relative percent change",
-        "percentage_of_pop": "Percentage of Working Age Population (2024)",
-        "change_pp": "Change in Percentage Points (2024-2014)",
-        "relative_change_title": "Relative Change (2024-2014)",
-        "percentage": "Percentage (%)",
-        "percent_change": "Percent Change (%)",
-        "key_stats": "Key Statistics",
-        "population_2024": "2024 Population",
-        "population_2014": "2014 Population",
-        "absolute_change": "Absolute Change",
-        "relative_change_stat": "Relative Change",
-        "of_working_age": "of working age",
-        "top_bottom": "Top & Bottom Kommuner",
-        "top_10": "Top 10 Kommuner",
-        "bottom_10": "Bottom 10 Kommuner",
-        "kommun": "Kommun",
-        "change_label": "Change",
-        "data_source": "**Data Source:** Statistics Sweden (SCB) - TAB4824",
-        "working_age_def": "**Working Age Definition:** 18-67 years",
-        "time_period": "**Time Period:** 2014-2024",
-        "license_text": "This work is licensed under a [Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International License](https://creativecommons.org/licenses/by-nc-sa/4.0/).",
-        "total_2024": "Total 2024",
-        "total_2014": "Total 2014"
-    },
-    "sv": {
-        "title": "🇸🇪 Demografisk förändring i Sverige",
-        "settings": "Inställningar",
-        "language": "Språk",
-        "view_type": "Visningstyp",
-        "snapshot": "Nuläge (2024)",
-        "change": "Förändring över tid (2014-2024)",
-        "born_overseas": "Födda utomlands",
-        "both_parents_overseas": "Båda föräldrarna födda utomlands (födda i Sverige)",
-        "one_parent_overseas": "En förälder född utomlands (födda i Sverige)",
-        "both_parents_sweden": "Båda föräldrarna födda i Sverige",
-        "show_aggregated": "Visa aggregerad vy",
-        "aggregated_categories": "**Aggregerade kategorier:**",
-        "select_categories": "Välj kategorier att kombinera",
-        "select_category": "Välj demografisk kategori",
-        "error_select_one": "Välj minst en kategori",
-        "foreign_background": "Utländsk bakgrund",
-        "change_metric": "Förändringsenhet",
-        "percentage_points": "Procentenheter",
-        "relative_change": "Relativ procentuell förändring",
-        "percentage_of_pop": "Andel av befolkningen i arbetsför ålder (2024)",
-        "change_pp": "Förändring i procentenheter (2024-2014)",
-        "relative_change_title": "Relativ förändring (2024-2014)",
-        "percentage": "Procent (%)",
-        "percent_change": "Procentuell förändring (%)",
-        "key_stats": "Nyckelstatistik",
-        "population_2024": "Befolkning 2024",
-        "population_2014": "Befolkning 2014",
-        "absolute_change": "Absolut förändring",
-        "relative_change_stat": "Relativ förändring",
-        "of_working_age": "av arbetsför ålder",
-        "top_bottom": "Högsta & lägsta kommuner",
-        "top_10": "Topp 10 kommuner",
-        "bottom_10": "Botten 10 kommuner",
-        "kommun": "Kommun",
-        "change_label": "Förändring",
-        "data_source": "**Datakälla:** Statistiska centralbyrån (SCB) - TAB4824",
-        "working_age_def": "**Definition av arbetsför ålder:** 18-67 år",
-        "time_period": "**Tidsperiod:** 2014-2024",
-        "license_text": "Detta verk är licensierat under en [Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International License](https://creativecommons.org/licenses/by-nc-sa/4.0/).",
-        "total_2024": "Totalt 2024",
-        "total_2014": "Totalt 2014"
+    """
+    Processed demographic data and, per level (kommun, län, riket), the
+    level's rows joined to its map and the map's GeoJSON, from the bundle
+    written by app_bundle.py. Nothing is merged, grouped or unioned and no
+    geodata library is imported at start-up, so switching level is a lookup.
+
+    The GeoJSON is the simplified geometry for MAP_ZOOM (simplify_geometry.py)
+    with every feature's id set, so the browser isn't sent vertices smaller
+    than a pixel and each interaction only supplies the values.
+    """
+    df = load_bundle(zoom=MAP_ZOOM)
+
+    # Attribute table of each level's map, one row per feature in GeoJSON order
+    maps = {}
+    for level, rows in df[df['map_row'].notna()].groupby('level', sort=False):
+        merged = rows.reset_index(drop=True)
+        maps[level] = (merged, feature_collection(merged))
+
+    return df, maps
+
+@st.cache_resource
+def load_year_store():
+    """
+    Counts per (map row, category, year) of each level, aligned once to the
+    rows of the level's merged table so every frame of the time series is an
+    array slice. None when process_data.py hasn't written the store.
+    """
+    if not YEARS_FILE.exists():
+        return None
+    with np.load(YEARS_FILE) as store:
+        codes, counts = store["codes"], store["counts"]
+        years = store["years"].tolist()
+        categories = store["categories"].tolist()
+
+    aligned = {}
+    for level, (merged, _) in load_data()[1].items():
+        rows = pd.Index(codes).get_indexer(merged["kommun_code"])
+        aligned[level] = np.full((len(rows),) + counts.shape[1:], np.nan)
+        aligned[level][rows >= 0] = counts[rows[rows >= 0]]
+    return {
+        "years": years,
+        "categories": categories,
+        "counts": aligned,
+        "totals": {level: counts.sum(axis=1) for level, counts in aligned.items()},
     }
-}
+
+@st.cache_resource
+def load_age_pyramids():
+    """
+    The single-year age file of process_data.py, memory-mapped: nothing is
+    read until a region is clicked, and then only its slice. Shared by every
+    session. None when the file hasn't been written.
+    """
+    return open_age_pyramids()
+
+df, maps = load_data()
+year_store = load_year_store()
+pyramids = load_age_pyramids()
+rerun_timing.lap("load_data")
 
 # Language selector in sidebar
 language = st.sidebar.radio("Language / Språk", ["English", "Svenska"], horizontal=True)
@@ -140,6 +127,8 @@ st.sidebar.header(t["settings"])
 
 # View type
 view_type_options = [t["snapshot"], t["change"]]
+if year_store is not None:
+    view_type_options.append(t["time_series"])
 view_type = st.sidebar.radio(
     t["view_type"],
     view_type_options
@@ -169,6 +158,10 @@ if show_aggregated:
         st.stop()
 
     category_label = t["foreign_background"] if len(selected_categories) > 1 else selected_categories[0]
+
+    # Key of the selected combination in the precomputed subsets table
+    selected_keys = [category_options_display[cat] for cat in selected_categories]
+    subset = "+".join(key for key in category_options_display.values() if key in selected_keys)
 else:
     selected_category = st.sidebar.selectbox(
         t["select_category"],
@@ -176,6 +169,17 @@ else:
     )
     category_label = selected_category
 
+# For the time series, pick (or play through) the year
+if view_type == t["time_series"]:
+    years = year_store["years"]
+    # While playing, the previous run hands the next year over here, before
+    # the slider exists (a widget's state can't change after it's drawn)
+    if "next_year" in st.session_state:
+        st.session_state["year"] = st.session_state.pop("next_year")
+    st.session_state.setdefault("year", years[-1])
+    year = st.sidebar.select_slider(t["year"], options=years, key="year")
+    playing = st.sidebar.toggle(t["play"], key="playing")
+
 # For change view, select metric type
 if view_type == t["change"]:
     change_metric_options = [t["percentage_points"], t["relative_change"]]
@@ -184,192 +188,319 @@ if view_type == t["change"]:
         change_metric_options
     )
 
-# Prepare map data
-map_data = merged_gdf.copy()
-
-if view_type == t["snapshot"]:
-    # Calculate the value to display
-    if show_aggregated:
-        # Sum up selected categories
-        cols_to_sum = [f"count_2024_{category_options_display[cat]}" for cat in selected_categories]
-        map_data['display_value'] = map_data[cols_to_sum].sum(axis=1)
-        # Calculate percentage
-        map_data['display_percentage'] = (map_data['display_value'] / map_data['total_2024'] * 100).round(2)
-        map_column = 'display_percentage'
-    else:
-        # Single category percentage
-        map_column = f"pct_2024_{category_options_display[selected_category]}"
-
-    title_text = f"{category_label} - {t['percentage_of_pop']}"
-    colorbar_title = t["percentage"]
-    color_scale = "Blues"
-    # Fixed range for snapshot: 0-100%
-    color_range = [0, 100]
-
-else:  # Change view
+# Geographic level of the map and tables
+level_options = {
+    t["level_kommun"]: "kommun",
+    t["level_lan"]: "lan",
+    t["level_riket"]: "riket",
+}
+level = level_options[st.sidebar.radio(t["level"], list(level_options))]
+rerun_timing.lap("sidebar")
+
+@st.cache_resource
+def view_cache_stats():
+    """Request and miss counters of build_view, shared by every session."""
+    return {"requests": 0, "misses": 0, "lock": threading.Lock()}
+
+@st.cache_resource(max_entries=VIEW_CACHE_ENTRIES)
+def build_view(lang, level, view_type, show_aggregated, selection, change_metric=None,
+               year=None):
+    """
+    Everything the main area shows for one sidebar state: the map figure,
+    the key statistics and the top/bottom tables (None for riket). `level`
+    picks the map: "kommun", "lan" or "riket". `selection` is the
+    combination key when aggregated, else the single category key.
+
+    Cached across sessions and bounded to the VIEW_CACHE_ENTRIES most
+    recently used states, so a popular view is only built once. The results
+    are shared and must not be modified.
+    """
+    stats = view_cache_stats()
+    with stats["lock"]:
+        stats["misses"] += 1
+
+    t = TRANSLATIONS[lang]
+    merged_df, geojson = maps[level]
     if show_aggregated:
-        # Calculate change for combined categories
-        if change_metric == t["percentage_points"]:
-            # Sum up percentage point changes
-            cols_2014 = [f"pct_2014_{category_options_display[cat]}" for cat in selected_categories]
-            cols_2024 = [f"pct_2024_{category_options_display[cat]}" for cat in selected_categories]
-
-            pct_2014 = map_data[cols_2014].sum(axis=1)
-            pct_2024 = map_data[cols_2024].sum(axis=1)
-            map_data['display_value'] = pct_2024 - pct_2014
-        else:  # Relative change
-            # Sum absolute counts then calculate relative change
-            count_cols_2014 = [f"count_2014_{category_options_display[cat]}" for cat in selected_categories]
-            count_cols_2024 = [f"count_2024_{category_options_display[cat]}" for cat in selected_categories]
-
-            count_2014 = map_data[count_cols_2014].sum(axis=1)
-            count_2024 = map_data[count_cols_2024].sum(axis=1)
-            map_data['display_value'] = ((count_2024 - count_2014) / count_2014.replace(0, 1) * 100).round(2)
-
-        map_column = 'display_value'
+        subset = selection
+        selected_keys = subset.split("+")
+        category_label = t["foreign_background"] if len(selected_keys) > 1 else t[selected_keys[0]]
     else:
-        # Single category
-        if change_metric == t["percentage_points"]:
-            # Calculate percentage point change
-            pct_2014 = map_data[f"pct_2014_{category_options_display[selected_category]}"]
-            pct_2024 = map_data[f"pct_2024_{category_options_display[selected_category]}"]
-            map_data['display_value'] = pct_2024 - pct_2014
-        else:  # Relative change
-            map_column = f"change_relative_{category_options_display[selected_category]}"
-            map_data['display_value'] = map_data[map_column]
+        category = selection
+        category_label = t[category]
 
+    # Prepare map data
+    if view_type == t["snapshot"]:
+        # Calculate the value to display
+        if show_aggregated:
+            # Precomputed percentage of the combined categories
+            map_column = f"pct_2024__{subset}"
+        else:
+            # Single category percentage
+            map_column = f"pct_2024_{category}"
+        display_value = merged_df[map_column]
+
+        title_text = f"{category_label} - {t['percentage_of_pop']}"
+        colorbar_title = t["percentage"]
+        color_scale = "Blues"
+        # Fixed range for snapshot: 0-100%
+        color_range = [0, 100]
+
+    elif view_type == t["time_series"]:
+        # Share of the selected categories in the chosen year: a slice of the
+        # year store, no pivoting
+        keys = selected_keys if show_aggregated else [category]
+        category_idx = [year_store["categories"].index(key) for key in keys]
+        year_idx = year_store["years"].index(year)
+        counts = year_store["counts"][level][:, category_idx, year_idx].sum(axis=1)
+        display_value = pd.Series(
+            (counts / year_store["totals"][level][:, year_idx] * 100).round(2),
+            index=merged_df.index,
+        )
         map_column = 'display_value'
 
-    if change_metric == t["percentage_points"]:
-        title_text = f"{category_label} - {t['change_pp']}"
-        colorbar_title = t["percentage_points"]
-        # Fixed range for percentage point change: -20 to +20
-        color_range = [-20, 20]
-    else:
-        title_text = f"{category_label} - {t['relative_change_title']}"
-        colorbar_title = t["percent_change"]
-        # Fixed range for relative change: -50% to +200%
-        color_range = [-50, 200]
-
-    # Use diverging color scale for change
-    color_scale = "RdBu_r"
-
-# Create the map
-fig = px.choropleth_mapbox(
-    map_data,
-    geojson=map_data.__geo_interface__,
-    locations=map_data.index,
-    color=map_column,
-    hover_name='kom_namn',
-    hover_data={
-        map_column: ':.2f',
-        'total_2024': ':,',
-        'total_2014': ':,'
-    },
-    color_continuous_scale=color_scale,
-    range_color=color_range,
-    mapbox_style="carto-positron",
-    center={"lat": 62.5, "lon": 16},
-    zoom=3.5,
-    opacity=0.7,
-    labels={
-        map_column: colorbar_title,
-        'total_2024': t["total_2024"],
-        'total_2014': t["total_2014"]
-    }
-)
-
-fig.update_layout(
-    title=title_text,
-    height=700,
-    margin={"r":0,"t":40,"l":0,"b":0}
-)
-
-# Display map
-st.plotly_chart(fig, use_container_width=True)
-
-# Statistics section
-st.header(t["key_stats"])
-
-col1, col2, col3, col4 = st.columns(4)
-
-if show_aggregated:
-    # Calculate aggregated stats
-    selected_cat_keys = [category_options_display[cat] for cat in selected_categories]
-
-    # 2024 totals
-    count_2024_cols = [f"count_2024_{cat}" for cat in selected_cat_keys]
-    total_selected_2024 = df[count_2024_cols].sum().sum()
-
-    # 2014 totals
-    count_2014_cols = [f"count_2014_{cat}" for cat in selected_cat_keys]
-    total_selected_2014 = df[count_2014_cols].sum().sum()
-
-else:
-    cat_key = category_options_display[selected_category]
-    total_selected_2024 = df[f"count_2024_{cat_key}"].sum()
-    total_selected_2014 = df[f"count_2014_{cat_key}"].sum()
-
-total_all_2024 = df['total_2024'].sum()
-total_all_2014 = df['total_2014'].sum()
-
-pct_of_total_2024 = (total_selected_2024 / total_all_2024 * 100)
-pct_of_total_2014 = (total_selected_2014 / total_all_2014 * 100)
+        title_text = f"{category_label} - {t['percentage_of_pop_year'].format(year=year)}"
+        colorbar_title = t["percentage"]
+        color_scale = "Blues"
+        color_range = [0, 100]
+
+    else:  # Change view
+        if show_aggregated:
+            # Precomputed change for combined categories
+            if change_metric == t["percentage_points"]:
+                # Sum of percentage point changes
+                map_column = f"change_pp__{subset}"
+            else:  # Relative change
+                # Relative change of the summed absolute counts
+                map_column = f"change_relative__{subset}"
+            display_value = merged_df[map_column]
+        else:
+            # Single category
+            if change_metric == t["percentage_points"]:
+                # Calculate percentage point change
+                pct_2014 = merged_df[f"pct_2014_{category}"]
+                pct_2024 = merged_df[f"pct_2024_{category}"]
+                display_value = pct_2024 - pct_2014
+            else:  # Relative change
+                display_value = merged_df[f"change_relative_{category}"]
+
+            map_column = 'display_value'
 
-with col1:
-    st.metric(
-        t["population_2024"],
-        f"{total_selected_2024:,.0f}",
-        f"{pct_of_total_2024:.1f}% {t['of_working_age']}"
+        if change_metric == t["percentage_points"]:
+            title_text = f"{category_label} - {t['change_pp']}"
+            colorbar_title = t["percentage_points"]
+            # Fixed range for percentage point change: -20 to +20
+            color_range = [-20, 20]
+        else:
+            title_text = f"{category_label} - {t['relative_change_title']}"
+            colorbar_title = t["percent_change"]
+            # Fixed range for relative change: -50% to +200%
+            color_range = [-50, 200]
+
+        # Use diverging color scale for change
+        color_scale = "RdBu_r"
+
+    # Per-view data is just the value vector keyed by municipality id plus
+    # the hover columns; the shared table and the polygons are never copied
+    map_data = merged_df[['id', 'kom_namn', 'total_2024', 'total_2014']].assign(
+        **{map_column: display_value}
     )
-
-with col2:
-    st.metric(
-        t["population_2014"],
-        f"{total_selected_2014:,.0f}",
-        f"{pct_of_total_2014:.1f}% {t['of_working_age']}"
+    rerun_timing.lap("view.values")
+
+    # Create the map
+    fig = px.choropleth_mapbox(
+        map_data,
+        geojson=geojson,
+        locations='id',
+        color=map_column,
+        hover_name='kom_namn',
+        hover_data={
+            'id': False,
+            map_column: ':.2f',
+            'total_2024': ':,',
+            'total_2014': ':,'
+        },
+        color_continuous_scale=color_scale,
+        range_color=color_range,
+        mapbox_style="carto-positron",
+        center=MAP_CENTER,
+        zoom=MAP_ZOOM,
+        opacity=0.7,
+        labels={
+            map_column: colorbar_title,
+            'total_2024': t["total_2024"],
+            'total_2014': t["total_2014"]
+        }
     )
 
-with col3:
-    change_abs = total_selected_2024 - total_selected_2014
-    st.metric(
-        t["absolute_change"],
-        f"{change_abs:+,.0f}"
+    fig.update_layout(
+        title=title_text,
+        height=700,
+        margin={"r":0,"t":40,"l":0,"b":0}
     )
+    rerun_timing.lap("view.figure")
 
-with col4:
-    change_rel = ((total_selected_2024 - total_selected_2014) / total_selected_2014 * 100)
-    st.metric(
-        t["relative_change_stat"],
-        f"{change_rel:+.1f}%"
-    )
+    # Key statistics, from the riket rollup
+    national = df[df['level'] == 'riket'].iloc[0]
+    if show_aggregated:
+        # Aggregated stats from the precomputed combination
+        total_selected_2024 = national[f"count_2024__{subset}"]
+        total_selected_2014 = national[f"count_2014__{subset}"]
+    else:
+        total_selected_2024 = national[f"count_2024_{category}"]
+        total_selected_2014 = national[f"count_2014_{category}"]
 
-# Top/Bottom kommuner
-st.header(t["top_bottom"])
+    total_all_2024 = national['total_2024']
+    total_all_2014 = national['total_2014']
 
-col_left, col_right = st.columns(2)
+    pct_of_total_2024 = (total_selected_2024 / total_all_2024 * 100)
+    pct_of_total_2014 = (total_selected_2014 / total_all_2014 * 100)
+    change_abs = total_selected_2024 - total_selected_2014
+    change_rel = ((total_selected_2024 - total_selected_2014) / total_selected_2014 * 100)
 
-with col_left:
-    st.subheader(t["top_10"])
-    if view_type == t["snapshot"]:
-        top_df = map_data.nlargest(10, map_column)[['kom_namn', map_column]].copy()
-        top_df.columns = [t["kommun"], f'{category_label} (%)']
+    metrics = [
+        (t["population_2024"], f"{total_selected_2024:,.0f}",
+         f"{pct_of_total_2024:.1f}% {t['of_working_age']}"),
+        (t["population_2014"], f"{total_selected_2014:,.0f}",
+         f"{pct_of_total_2014:.1f}% {t['of_working_age']}"),
+        (t["absolute_change"], f"{change_abs:+,.0f}", None),
+        (t["relative_change_stat"], f"{change_rel:+.1f}%", None),
+    ]
+
+    rerun_timing.lap("view.statistics")
+
+    # Top/Bottom kommuner or län; riket is a single row
+    if level == "riket":
+        return {"fig": fig, "metrics": metrics, "top": None, "bottom": None}
+    name_column = t["kommun"] if level == "kommun" else t["lan"]
+    if view_type != t["change"]:
+        table_columns = [name_column, f'{category_label} (%)']
     else:
-        top_df = map_data.nlargest(10, map_column)[['kom_namn', map_column]].copy()
-        top_df.columns = [t["kommun"], f'{t["change_label"]} ({colorbar_title})']
-
-    st.dataframe(top_df.reset_index(drop=True), use_container_width=True)
-
-with col_right:
-    st.subheader(t["bottom_10"])
-    if view_type == t["snapshot"]:
-        bottom_df = map_data.nsmallest(10, map_column)[['kom_namn', map_column]].copy()
-        bottom_df.columns = [t["kommun"], f'{category_label} (%)']
+        table_columns = [name_column, f'{t["change_label"]} ({colorbar_title})']
+    top_df = map_data.nlargest(10, map_column)[['kom_namn', map_column]].reset_index(drop=True)
+    top_df.columns = table_columns
+    bottom_df = map_data.nsmallest(10, map_column)[['kom_namn', map_column]].reset_index(drop=True)
+    bottom_df.columns = table_columns
+    rerun_timing.lap("view.tables")
+
+    return {"fig": fig, "metrics": metrics, "top": top_df, "bottom": bottom_df}
+
+# Serve the main area for this sidebar state from the shared cache
+stats = view_cache_stats()
+with stats["lock"]:
+    stats["requests"] += 1
+view = build_view(
+    lang,
+    level,
+    view_type,
+    show_aggregated,
+    subset if show_aggregated else category_options_display[selected_category],
+    change_metric if view_type == t["change"] else None,
+    year if view_type == t["time_series"] else None,
+)
+# A miss has timed its own stages; this is the cache lookup
+rerun_timing.lap("view", cached="view.values" not in timer.stages)
+
+def pyramid_figure(counts, categories, t, title):
+    """
+    Age pyramid of (age x sex x category) `counts`: men to the left, women
+    to the right, the categories stacked.
+    """
+    fig = go.Figure()
+    ages = pyramids["ages"]
+    for i, category in enumerate(categories):
+        for sex, sign in ((0, -1), (1, 1)):
+            fig.add_bar(
+                y=ages, x=sign * counts[:, sex, i], orientation='h',
+                name=t[category], legendgroup=category, showlegend=sex == 0,
+                marker_color=PYRAMID_COLOURS[i], customdata=counts[:, sex, i],
+                hovertemplate=(f"{t['men'] if sex == 0 else t['women']}, "
+                               f"%{{y}} {t['age_unit']}: %{{customdata:,}}<extra>{t[category]}</extra>"),
+            )
+
+    # Population on both sides of the axis, without the sign
+    limit = max(counts.sum(axis=2).max(), 1)
+    ticks = np.linspace(-limit, limit, 5)
+    fig.update_xaxes(tickvals=ticks, ticktext=[f"{abs(tick):,.0f}" for tick in ticks],
+                     title=f"← {t['men']}   |   {t['women']} →")
+    fig.update_yaxes(title=t["age"])
+    fig.update_layout(title=title, barmode='relative', bargap=0, height=600,
+                      legend={"orientation": "h", "y": -0.15})
+    return fig
+
+# Display map. With the age file present, clicking a region selects it for
+# the age pyramid below.
+if pyramids is not None:
+    event = st.plotly_chart(view["fig"], use_container_width=True, key="map",
+                            on_select="rerun", selection_mode="points")
+else:
+    st.plotly_chart(view["fig"], use_container_width=True)
+rerun_timing.lap("map")
+
+# Age pyramid of the clicked region: one slice of the memory-mapped file
+if pyramids is not None:
+    st.header(t["age_pyramid"])
+    points = event["selection"]["points"] if event else []
+    merged_df = maps[level][0]
+    # A selection left over from another level's map matches no region here
+    location = points[0].get("location") if points else None
+    clicked = merged_df[merged_df['id'] == location]
+    if not clicked.empty:
+        region = clicked.iloc[0]
+        pyramid_years = pyramids["years"]
+        default_year = year if view_type == t["time_series"] and year in pyramid_years else pyramid_years[-1]
+        pyramid_year = st.select_slider(t["year"], options=pyramid_years, value=default_year,
+                                        key="pyramid_year")
+        counts = age_pyramid(pyramids, int(region['kommun_code']), pyramid_year)
+        st.plotly_chart(
+            pyramid_figure(counts, pyramids["categories"], t,
+                           f"{region['kom_namn']} ({pyramid_year})"),
+            use_container_width=True,
+        )
     else:
-        bottom_df = map_data.nsmallest(10, map_column)[['kom_namn', map_column]].copy()
-        bottom_df.columns = [t["kommun"], f'{t["change_label"]} ({colorbar_title})']
+        st.caption(t["click_for_pyramid"])
+    rerun_timing.lap("age_pyramid")
+
+# Statistics section
+st.header(t["key_stats"])
 
-    st.dataframe(bottom_df.reset_index(drop=True), use_container_width=True)
+for col, (label, value, delta) in zip(st.columns(4), view["metrics"]):
+    with col:
+        st.metric(label, value, delta)
+
+# Top/Bottom kommuner or län
+if view["top"] is not None:
+    suffix = "" if level == "kommun" else "_lan"
+    st.header(t[f"top_bottom{suffix}"])
+
+    col_left, col_right = st.columns(2)
+
+    with col_left:
+        st.subheader(t[f"top_10{suffix}"])
+        st.dataframe(view["top"], use_container_width=True)
+
+    with col_right:
+        st.subheader(t[f"bottom_10{suffix}"])
+        st.dataframe(view["bottom"], use_container_width=True)
+rerun_timing.lap("statistics")
+
+# Admin panel (?admin=1): how often views were served from the cache
+if st.query_params.get("admin"):
+    with st.sidebar.expander("View cache"):
+        requests, misses = stats["requests"], stats["misses"]
+        hits = requests - misses
+        st.metric("Hits", f"{hits:,}", f"{hits / requests:.0%} of requests" if requests else None)
+        st.metric("Misses", f"{misses:,}")
+        st.caption(f"Up to {VIEW_CACHE_ENTRIES} views kept, least recently used dropped first")
+        if st.button("Clear view cache"):
+            build_view.clear()
+            with stats["lock"]:
+                stats["requests"] = stats["misses"] = 0
+    with st.sidebar.expander("Rerun timings"):
+        st.dataframe(rerun_timing.recent_percentiles(), use_container_width=True)
+        st.caption(f"Milliseconds per stage over the last {rerun_timing.RECENT_RERUNS:,} reruns "
+                   f"of this server process; every rerun is logged to "
+                   f"{rerun_timing.TIMING_LOG_FILE.name}")
 
 # Footer
 st.markdown("---")
@@ -381,3 +512,25 @@ st.markdown(f"""
 [![CC BY-NC-SA 4.0](https://licensebuttons.net/l/by-nc-sa/4.0/88x31.png)](https://creativecommons.org/licenses/by-nc-sa/4.0/)
 {t["license_text"]}
 """)
+rerun_timing.lap("footer")
+
+# Write this rerun's timings with the sidebar state, and which of its
+# settings changed since the session's previous rerun
+timing_state = {
+    "lang": lang, "level": level, "view_type": view_type,
+    "selection": subset if show_aggregated else category_options_display[selected_category],
+    "change_metric": change_metric if view_type == t["change"] else None,
+    "year": year if view_type == t["time_series"] else None,
+}
+previous_state = st.session_state.get("timing_state", {})
+rerun_timing.finish(
+    changed=[key for key, value in timing_state.items() if previous_state.get(key) != value],
+    state=timing_state,
+)
+st.session_state["timing_state"] = timing_state
+
+# Advance a playing time series: wait, hand the next year to the slider, rerun
+if view_type == t["time_series"] and playing:
+    time.sleep(FRAME_SECONDS)
+    st.session_state["next_year"] = years[(years.index(year) + 1) % len(years)]
+    st.rerun()
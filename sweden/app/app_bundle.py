@@ -0,0 +1,180 @@
+"""
+Build the pre-merged data bundle that app.py starts from
+
+A cold start of the app used to import geopandas, read the full resolution
+GeoJSON, read both processed CSVs and join them on the kommun code. This
+script does all of that once and writes `app_bundle.parquet`:
+
+- one typed row per region of processed_demographics.csv, with the
+  aggregated columns of processed_subsets.csv ("pct_2024__born_overseas+...")
+- for every kommun, län and riket, the feature of its level's map: `id`,
+  `kom_namn` (the feature's name), `map_row` (its position in that map) and
+  `feature`: the GeoJSON feature as JSON text, simplified for the app's
+  zoom and with its `id` set, ready for Plotly. The län and riket features
+  are the boundaries dissolved by simplify_geometry.py.
+- the SHA-256 of each source in the file metadata, so a stale bundle is
+  noticed
+
+Loading it needs only pyarrow and json. Rebuild it after changing any of the
+sources (process_data.py does so at the end of every run):
+
+    python3 app_bundle.py
+"""
+import argparse
+import hashlib
+import json
+import sys
+import warnings
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from simplify_geometry import LAN_SOURCE, RIKET_SOURCE, pick_level
+
+APP_DIR = Path(__file__).parent
+BUNDLE_FILE = APP_DIR / "app_bundle.parquet"
+DEMOGRAPHICS_FILE = APP_DIR / "processed_demographics.csv"
+SUBSETS_FILE = APP_DIR / "processed_subsets.csv"
+GEOJSON_FILE = APP_DIR / "swedish_municipalities.geojson"
+
+# Map of each level (the `level` of processed_demographics.csv) and the
+# property holding its features' names, in the app's order
+LEVELS = {
+    "kommun": (GEOJSON_FILE, "kom_namn"),
+    "lan": (LAN_SOURCE, "name"),
+    "riket": (RIKET_SOURCE, "name"),
+}
+
+# Zoom of the app's initial map view; picks the simplified geometry level
+MAP_ZOOM = 3.5
+
+
+def sources(zoom=MAP_ZOOM):
+    """The files the bundle is built from."""
+    files = {"demographics": DEMOGRAPHICS_FILE, "subsets": SUBSETS_FILE}
+    for level, (geojson_file, _) in LEVELS.items():
+        files[f"{level}_geojson"] = geojson_file
+        files[f"{level}_map_geojson"] = pick_level(zoom, geojson_file)
+    return files
+
+
+def source_hashes(zoom=MAP_ZOOM):
+    """SHA-256 of every source, as stored in the bundle."""
+    return {name: hashlib.sha256(Path(path).read_bytes()).hexdigest()
+            for name, path in sources(zoom).items()}
+
+
+def build_tables(zoom=MAP_ZOOM):
+    """
+    The bundle's contents, built from the sources: one row per region with
+    its level's map feature joined on, kommuner first, then län and riket,
+    each in map order.
+    """
+    # The municipality index is only needed to build the bundle
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from municipalities import swedish_index
+
+    df = pd.read_csv(DEMOGRAPHICS_FILE)
+
+    # Precomputed aggregates for every combination of categories, one column
+    # per (metric, subset), e.g. "pct_2024__born_overseas+both_parents_overseas"
+    subsets = pd.read_csv(SUBSETS_FILE, index_col=['subset', 'kommun_code'])
+    subset_columns = subsets.drop(columns='kommun').unstack('subset')
+    subset_columns.columns = [f"{metric}__{subset}" for metric, subset in subset_columns.columns]
+    table = df.merge(subset_columns, left_on='kommun_code', right_index=True, how='left')
+
+    # Join each level's features on the integer code; the index reports
+    # kommuner that don't match
+    index = swedish_index()
+    features = pd.concat([map_features(level, zoom) for level in LEVELS], ignore_index=True)
+    kommuner = table[table['kommun_code'].isin(index.codes('kommun'))]
+    index.join(features[features['level'] == 'kommun'].drop(columns='level'), kommuner,
+               label='processed_demographics.csv')
+    table = table.merge(features, on=['level', 'kommun_code'], how='left')
+
+    # Level by level in LEVELS order, each level's map rows in map order
+    level_order = table['level'].map({level: i for i, level in enumerate(LEVELS)})
+    return (table.assign(level_order=level_order)
+            .sort_values(['level_order', 'map_row'], na_position='last', kind='stable',
+                         ignore_index=True)
+            .drop(columns='level_order'))
+
+
+def map_features(level, zoom=MAP_ZOOM):
+    """
+    The features of one level's map as a table: `id`, `kom_namn`,
+    `kommun_code`, `map_row` and `feature`, the feature's JSON text.
+    """
+    geojson_file, name_property = LEVELS[level]
+    with open(pick_level(zoom, geojson_file), encoding="utf-8") as f:
+        geojson = json.load(f)
+    for feature in geojson["features"]:
+        feature["id"] = feature["properties"]["id"]
+
+    features = pd.DataFrame({
+        'id': [feature["properties"]["id"] for feature in geojson["features"]],
+        'kom_namn': [feature["properties"][name_property] for feature in geojson["features"]],
+    })
+    features['kommun_code'] = features['id'].astype(int)
+    features['level'] = level
+    features['map_row'] = pd.array(range(len(features)), dtype="Int16")
+    features['feature'] = [json.dumps(feature, ensure_ascii=False, separators=(",", ":"))
+                           for feature in geojson["features"]]
+    return features
+
+
+def feature_collection(table):
+    """
+    The GeoJSON of the `feature` column, in row order. Pass the rows of one
+    level for that level's map.
+    """
+    features = table['feature'].dropna()
+    return json.loads('{"type":"FeatureCollection","features":[' + ",".join(features) + "]}")
+
+
+def write_bundle(path=BUNDLE_FILE, zoom=MAP_ZOOM):
+    """Build the bundle and write it to `path`."""
+    table = build_tables(zoom)
+    arrow = pa.Table.from_pandas(table, preserve_index=False)
+    arrow = arrow.replace_schema_metadata({
+        **arrow.schema.metadata,
+        b"sources": json.dumps(source_hashes(zoom)).encode("utf-8"),
+        b"zoom": str(zoom).encode("utf-8"),
+    })
+    pq.write_table(arrow, path, compression="zstd")
+    on_map = table[table['map_row'].notna()].groupby('level', sort=False).size()
+    print(f"Saved {len(table)} rows to {path}, on the map: "
+          + ", ".join(f"{count} {level}" for level, count in on_map.items()))
+
+
+def load_bundle(path=BUNDLE_FILE, zoom=MAP_ZOOM):
+    """
+    The bundle's table (see build_tables). A missing bundle, or one built
+    from other sources or for another zoom, is rebuilt in memory with a
+    warning.
+    """
+    path = Path(path)
+    if path.exists():
+        metadata = pq.read_schema(path).metadata
+        if (float(metadata[b"zoom"]) == zoom
+                and json.loads(metadata[b"sources"]) == source_hashes(zoom)):
+            return pq.read_table(path).to_pandas()
+        reason = "is out of date"
+    else:
+        reason = "is missing"
+    warnings.warn(f"{path.name} {reason}; building it in memory. "
+                  f"Run `python3 app_bundle.py` to save it.", stacklevel=2)
+    return build_tables(zoom)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-o", "--output", type=Path, default=BUNDLE_FILE,
+                        help="Bundle file (default: app_bundle.parquet)")
+    parser.add_argument("--zoom", type=float, default=MAP_ZOOM,
+                        help=f"Map zoom to pick the geometry for (default: {MAP_ZOOM})")
+    args = parser.parse_args()
+
+    write_bundle(args.output, args.zoom)
@@ -0,0 +1,214 @@
+"""
+Export the explorer as a static site that recolours the map in the browser
+
+Every view app.py can show is precomputed: level (kommun, län, riket) x
+view type (snapshot, change in percentage points, relative change, every
+year of the time series) x category or combination of categories. Each view
+is one float32 value per feature of its level's map, and all of them are
+written back to back to `values.bin`, level by level; `views.json` holds
+where each level starts, the offset of every view, the region names and
+totals, the key statistics, the colour scales and the interface text of
+both languages. `index.html` loads those two files and the simplified
+polygons of every level once and then only swaps value arrays, so the site
+can be served from any static host or CDN without a Python process per
+reader:
+
+    python export_static.py
+    python export_static.py -o /tmp/site && python -m http.server -d /tmp/site
+"""
+import argparse
+import json
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.colors
+
+from app_bundle import LEVELS
+from simplify_geometry import pick_level
+from translations import TRANSLATIONS
+
+# The municipality index is shared with the Danish analysis at the repo root
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from municipalities import swedish_index
+
+APP_DIR = Path(__file__).parent
+OUTPUT_DIR = APP_DIR / "static"
+PAGE = APP_DIR / "static_page.html"
+
+# Same view of the map as the app
+MAP_ZOOM = 3.5
+
+# Polygons of each level's map in the exported site
+GEOMETRY_FILES = {
+    "kommun": "municipalities.geojson",
+    "lan": "lan.geojson",
+    "riket": "riket.geojson",
+}
+
+# Colour scale and fixed range of each view type, as in app.py
+SCALES = {
+    "snapshot": ("Blues", [0, 100]),
+    "year": ("Blues", [0, 100]),
+    "change_pp": ("RdBu_r", [-20, 20]),
+    "change_relative": ("RdBu_r", [-50, 200]),
+}
+
+CATEGORIES = ["born_overseas", "both_parents_overseas", "one_parent_overseas",
+              "both_parents_sweden"]
+
+
+def load_tables():
+    """
+    The app's tables, without geopandas: wide table, subsets and the
+    polygons of each level's map.
+    """
+    df = pd.read_csv(APP_DIR / "processed_demographics.csv")
+    subsets = pd.read_csv(APP_DIR / "processed_subsets.csv", index_col=['subset', 'kommun_code'])
+    geojsons = {}
+    for level, (geojson_file, _) in LEVELS.items():
+        with open(pick_level(MAP_ZOOM, geojson_file), encoding="utf-8") as f:
+            geojsons[level] = json.load(f)
+    return df, subsets, geojsons
+
+
+def feature_table(df, geojson, level="kommun"):
+    """
+    One row per feature of `level`'s map, in GeoJSON order, with the wide
+    table's row of that level joined on the code (the rows of app.py's
+    merged table).
+    """
+    name_property = LEVELS[level][1]
+    features = pd.DataFrame({
+        'id': [feature["properties"]["id"] for feature in geojson["features"]],
+        'kom_namn': [feature["properties"][name_property] for feature in geojson["features"]],
+    })
+    features['kommun_code'] = features['id'].astype(int)
+    rows = df[df['level'] == level]
+    return swedish_index().join(features, rows, label=f'processed_demographics.csv {level}')
+
+
+def build_views(merged, subsets, year_store=None):
+    """
+    Value vector of every view, keyed (view type, mode, selection). Mode is
+    "single" for one category picked from the dropdown and "combined" for
+    the aggregated view's combinations. Time series views are keyed by the
+    year instead of a mode and only exist per combination, since one
+    category and a one-category combination are the same slice there.
+    """
+    codes = merged['kommun_code']
+    views = {}
+    for cat in CATEGORIES:
+        pct_2024 = merged[f"pct_2024_{cat}"]
+        views[("snapshot", "single", cat)] = pct_2024
+        views[("change_pp", "single", cat)] = pct_2024 - merged[f"pct_2014_{cat}"]
+        views[("change_relative", "single", cat)] = merged[f"change_relative_{cat}"]
+
+    for subset, rows in subsets.groupby(level='subset', sort=False):
+        rows = rows.droplevel('subset').reindex(codes)
+        views[("snapshot", "combined", subset)] = rows['pct_2024']
+        views[("change_pp", "combined", subset)] = rows['change_pp']
+        views[("change_relative", "combined", subset)] = rows['change_relative']
+
+    if year_store is not None:
+        positions = pd.Index(year_store["codes"]).get_indexer(codes)
+        counts = np.full((len(positions),) + year_store["counts"].shape[1:], np.nan)
+        counts[positions >= 0] = year_store["counts"][positions[positions >= 0]]
+        totals = counts.sum(axis=1)
+        categories = year_store["categories"].tolist()
+        for subset in subsets.index.unique('subset'):
+            category_idx = [categories.index(key) for key in subset.split("+")]
+            shares = (counts[:, category_idx].sum(axis=1) / totals * 100).round(2)
+            for i, year in enumerate(year_store["years"].tolist()):
+                views[("year", str(year), subset)] = shares[:, i]
+    return views
+
+
+def key_statistics(df, subsets):
+    """
+    Selected and total population of riket in both years, per single
+    category and combination.
+    """
+    national = df[df['level'] == 'riket'].iloc[0]
+    national_subsets = subsets.xs(national['kommun_code'], level='kommun_code')
+    return {
+        "single": {cat: [float(national[f"count_2024_{cat}"]), float(national[f"count_2014_{cat}"])]
+                   for cat in CATEGORIES},
+        "combined": {subset: [float(row['count_2024']), float(row['count_2014'])]
+                     for subset, row in national_subsets.iterrows()},
+        "total": [float(national['total_2024']), float(national['total_2014'])],
+    }
+
+
+def export(output_dir=OUTPUT_DIR, years_file=APP_DIR / "demographic_years.npz"):
+    """Write index.html, views.json, values.bin and the polygons to `output_dir`."""
+    df, subsets, geojsons = load_tables()
+
+    year_store = None
+    if Path(years_file).exists():
+        with np.load(years_file) as store:
+            year_store = {key: store[key] for key in store.files}
+
+    # Each level's views back to back, the levels one after the other; a
+    # level's `start` is where its first view begins, in values
+    blocks, levels, start = [], {}, 0
+    for level, geojson in geojsons.items():
+        merged = feature_table(df, geojson, level)
+        views = build_views(merged, subsets, year_store)
+        blocks.append(np.vstack([np.asarray(v, dtype=np.float32) for v in views.values()]))
+
+        offsets = {}
+        for i, (view, mode, selection) in enumerate(views):
+            offsets.setdefault(view, {}).setdefault(mode, {})[selection] = i
+        levels[level] = {
+            "start": start,
+            "rows": len(merged),
+            "geometry": GEOMETRY_FILES[level],
+            "ids": merged['id'].tolist(),
+            "names": merged['kom_namn'].tolist(),
+            "total_2024": merged['total_2024'].fillna(0).astype(int).tolist(),
+            "total_2014": merged['total_2014'].fillna(0).astype(int).tolist(),
+            "views": offsets,
+        }
+        start += blocks[-1].size
+    values = np.concatenate([block.ravel() for block in blocks])
+
+    manifest = {
+        "levels": levels,
+        "categories": CATEGORIES,
+        "years": year_store["years"].tolist() if year_store is not None else [],
+        "stats": key_statistics(df, subsets),
+        "scales": {view: {"colours": plotly.colors.get_colorscale(name), "range": range_}
+                   for view, (name, range_) in SCALES.items()},
+        "translations": TRANSLATIONS,
+    }
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # Little-endian float32, NaN where a kommun has no value
+    values.astype("<f4").tofile(output_dir / "values.bin")
+    with open(output_dir / "views.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+    for level, geojson in geojsons.items():
+        with open(output_dir / GEOMETRY_FILES[level], "w", encoding="utf-8") as f:
+            json.dump(geojson, f, ensure_ascii=False, separators=(",", ":"))
+    shutil.copyfile(PAGE, output_dir / "index.html")
+
+    size = sum(path.stat().st_size for path in output_dir.iterdir())
+    print(f"Exported {len(views)} views per level of "
+          + ", ".join(f"{level['rows']} {name}" for name, level in levels.items())
+          + f" to {output_dir} ({size / 1024:.0f} KB)")
+    return output_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-o", "--output-dir", type=Path, default=OUTPUT_DIR,
+                        help="Folder to write the site to (default: static)")
+    parser.add_argument("--years-file", type=Path, default=APP_DIR / "demographic_years.npz",
+                        help="Year store for the time series views (skipped if missing)")
+    args = parser.parse_args()
+
+    export(args.output_dir, args.years_file)
@@ -1,112 +1,631 @@
 """
 Process Swedish demographic data from SCB into clean format for Streamlit app
 """
+import argparse
+import hashlib
+import itertools
+import json
+import re
+import sys
+from datetime import datetime
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# The municipality index and file hashes are shared with the analyses at the repo root
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from hashing import file_hash
+from municipalities import SWEDISH_LAN, swedish_index
+
+from age_pyramids import AGES, SEXES, write_age_pyramids
+from app_bundle import DEMOGRAPHICS_FILE, write_bundle
+
+# Category mapping for cleaner names
+CATEGORY_MAP = {
+    "utrikes födda": "born_overseas",
+    "inrikes födda med två utrikes födda föräldrar": "both_parents_overseas",
+    "inrikes födda med en inrikes och en utrikes född förälder": "one_parent_overseas",
+    "inrikes födda med två inrikes födda föräldrar": "both_parents_sweden"
+}
+
+# Rows per chunk when streaming the raw extract. Peak memory is bounded by
+# the chunk size rather than the size of the file.
+CHUNKSIZE = 500_000
+
+# Only these columns are needed; skipping the rest keeps each chunk small
+SOURCE_COLUMNS = ['region', 'utländsk/svensk bakgrund', 'ålder', 'år', 'Antal personer']
+
+# Repeated label columns, stored dictionary-encoded in the cache
+CATEGORICAL_COLUMNS = ['region', 'utländsk/svensk bakgrund', 'kön']
+
+# Integer value of `ålder` for rows that are not a single age ("totalt ålder")
+TOTAL_AGE = -1
+
+# SCB region label: code and name ("0114 Upplands Väsby"). Kommun codes have
+# four digits, the first two being the län ("01"); riket is "00".
+REGION = re.compile(r'^(\d+)\s+(.*)$')
+
+# Levels of the rollup, from the kommun up, and the code and name of riket
+LEVELS = ['kommun', 'lan', 'riket']
+RIKET = (0, 'Riket')
+
+CACHE_DIR = "cache"
+
+# Age bands kept in the cube (inclusive). The app shows working age, 18-67.
+AGE_BANDS = {
+    "18-67": (18, 67),
+    "20-64": (20, 64),
+}
+DEFAULT_BAND = "18-67"
+DEFAULT_YEARS = (2014, 2024)
+
+CUBE_FILE = "demographic_cube.csv"
+OUTPUT_FILE = "processed_demographics.csv"
+SUBSETS_FILE = "processed_subsets.csv"
+YEARS_FILE = "demographic_years.npz"
+MANIFEST_FILE = "ingest_manifest.json"
+AGES_FILE = "demographic_ages.bin"
+AGES_INDEX_FILE = "demographic_ages.json"
+
+
+def parse_age(label):
+    """Turn an SCB age label ("18 år", "100+ år") into an integer age."""
+    digits = label.split(' ')[0].rstrip('+')
+    return int(digits) if digits.isdigit() else TOTAL_AGE
+
+
+def parse_band(label):
+    """Turn an age band label ("20-64") into an inclusive (low, high) pair."""
+    low, high = (int(part) for part in label.split('-'))
+    if low > high:
+        raise ValueError(f"Invalid age band: {label}")
+    return low, high
+
+
+def normalise_chunk(chunk):
+    """
+    Give a raw chunk the same types as the cache: integer age and year,
+    categorical labels.
+    """
+    ages = {label: parse_age(label) for label in chunk['ålder'].unique()}
+    chunk['ålder'] = chunk['ålder'].map(ages).astype('int16')
+    chunk['år'] = chunk['år'].astype('int16')
+    chunk['Antal personer'] = chunk['Antal personer'].astype('int32')
+    for col in CATEGORICAL_COLUMNS:
+        if col in chunk.columns:
+            chunk[col] = chunk[col].astype('category')
+    return chunk
+
+
+def filter_chunk(chunk, working_ages, years=None, by=('kommun_code', 'kommun', 'category', 'år')):
+    """
+    Keep the kommun rows for `working_ages`, `years` (all years if None) and
+    the 4 categories, and aggregate them by the `by` columns. The län and
+    riket rows of the extract are dropped: rollup_cube sums them from the
+    kommuner, so every level adds up.
+    """
+    mask = (
+        (chunk['ålder'].isin(working_ages)) &
+        (chunk['utländsk/svensk bakgrund'].isin(CATEGORY_MAP.keys()))
+    )
+    if years is not None:
+        mask &= chunk['år'].isin(years)
+    chunk = chunk[mask].copy()
+
+    # Map category names
+    chunk['category'] = chunk['utländsk/svensk bakgrund'].astype(str).map(CATEGORY_MAP)
+
+    # Split the region label into the SCB code and the name, once per
+    # distinct region rather than once per row
+    regions = chunk['region'].astype(str)
+    labels = {region: REGION.match(region) for region in regions.unique()}
+    kommuner = {region: match for region, match in labels.items()
+                if match and len(match.group(1)) == 4}
+    chunk = chunk[regions.isin(kommuner.keys())]
+    regions = regions[regions.isin(kommuner.keys())]
+    chunk['kommun_code'] = regions.map({region: int(match.group(1))
+                                        for region, match in kommuner.items()}).astype('int32')
+    chunk['kommun'] = regions.map({region: match.group(2) for region, match in kommuner.items()})
+
+    # Sum across gender and individual ages
+    return chunk.groupby(list(by))['Antal personer'].sum()
+
+
+def iter_csv_chunks(source, chunksize=CHUNKSIZE, columns=None):
+    """
+    Stream the raw SCB extract in chunks of `chunksize` rows (all at once with
+    chunksize=None), normalised with `normalise_chunk`.
+    """
+    usecols = None if columns is None else (lambda col: col in columns)
+    reader = pd.read_csv(source, encoding="ISO-8859-1", usecols=usecols,
+                         chunksize=chunksize)
+    if chunksize is None:
+        reader = [reader]
+
+    for i, chunk in enumerate(reader):
+        if i == 0:
+            print("Unique age values sample:")
+            print(chunk['ålder'].unique()[:20])
+        yield normalise_chunk(chunk)
+
 
-def process_demographic_data():
+def cache_prefix(source):
     """
-    Process TAB4824_sv.csv to extract working age (18-67) demographics by kommun
-    for 2014 and 2024, broken down by the 4 demographic categories.
+    Start of the cache names of `source`: its stem and a hash of its resolved
+    path, so same-named extracts in different directories keep their caches.
     """
-    # Read with correct encoding
-    df = pd.read_csv("TAB4824_sv.csv", encoding="ISO-8859-1")
+    source = Path(source)
+    path_digest = hashlib.sha256(str(source.resolve()).encode('utf-8')).hexdigest()
+    return f"{source.stem}-{path_digest[:8]}-"
 
-    # Category mapping for cleaner names
-    category_map = {
-        "utrikes födda": "born_overseas",
-        "inrikes födda med två utrikes födda föräldrar": "both_parents_overseas",
-        "inrikes födda med en inrikes och en utrikes född förälder": "one_parent_overseas",
-        "inrikes födda med två inrikes födda föräldrar": "both_parents_sweden"
+
+def cache_path_for(source, cache_dir=CACHE_DIR):
+    """Cache file for `source`, keyed on its path and the hash of its contents."""
+    return Path(cache_dir) / f"{cache_prefix(source)}{file_hash(source)[:16]}.parquet"
+
+
+def build_cache(source, cache_path, chunksize=CHUNKSIZE):
+    """
+    One-time conversion of the raw extract into a Parquet file with
+    dictionary-encoded labels and integer age and year.
+    """
+    cache_path = Path(cache_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix('.tmp')
+
+    writer = None
+    try:
+        for chunk in iter_csv_chunks(source, chunksize):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                # Labels are stored as plain strings and dictionary-encoded by
+                # Parquet, so chunks with different category sets share a schema
+                schema = pa.schema([
+                    field.with_type(field.type.value_type)
+                    if pa.types.is_dictionary(field.type) else field
+                    for field in table.schema
+                ])
+                writer = pq.ParquetWriter(tmp_path, schema,
+                                          use_dictionary=True, compression='zstd')
+            writer.write_table(table.cast(writer.schema))
+    except BaseException:
+        # A failed or interrupted conversion leaves no partial file behind
+        if writer is not None:
+            writer.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    if writer is not None:
+        writer.close()
+    tmp_path.replace(cache_path)
+
+    # Older caches of the same extract (same path, other contents) are stale now
+    prefix = cache_prefix(source)
+    for stale in cache_path.parent.glob("*.parquet"):
+        if stale.name.startswith(prefix) and stale != cache_path:
+            stale.unlink()
+
+    print(f"Cached {source} as {cache_path}")
+    return cache_path
+
+
+def ensure_cache(source, cache_dir=CACHE_DIR, chunksize=CHUNKSIZE):
+    """Return the cache for `source`, building it first if needed."""
+    cache_path = cache_path_for(source, cache_dir)
+    if not cache_path.exists():
+        build_cache(source, cache_path, chunksize)
+    return cache_path
+
+
+def iter_cache_chunks(cache_path, columns=None, working_ages=None, years=None):
+    """
+    Stream record batches from the cache, skipping rows outside `working_ages`
+    and `years` before they are converted to pandas.
+    """
+    dictionary_columns = [col for col in CATEGORICAL_COLUMNS
+                          if columns is None or col in columns]
+    dataset = ds.dataset(
+        cache_path,
+        format=ds.ParquetFileFormat(
+            read_options=ds.ParquetReadOptions(dictionary_columns=dictionary_columns)
+        ),
+    )
+
+    condition = None
+    if working_ages is not None:
+        condition = ds.field('ålder').isin(list(working_ages))
+    if years is not None:
+        year_condition = ds.field('år').isin(list(years))
+        condition = year_condition if condition is None else condition & year_condition
+
+    for batch in dataset.to_batches(columns=columns, filter=condition):
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def iter_source_chunks(source, chunksize=CHUNKSIZE, use_cache=True,
+                       cache_dir=CACHE_DIR, working_ages=None, years=None,
+                       columns=SOURCE_COLUMNS):
+    """
+    Stream the SCB extract, from its Parquet cache (built on the first run) when
+    `use_cache` is set, otherwise by parsing the CSV in chunks of `chunksize`.
+    """
+    if use_cache:
+        cache_path = ensure_cache(source, cache_dir, chunksize)
+        return iter_cache_chunks(cache_path, columns, working_ages, years)
+    return iter_csv_chunks(source, chunksize, columns)
+
+
+def build_cube(source, bands=AGE_BANDS, chunksize=CHUNKSIZE, use_cache=True,
+               cache_dir=CACHE_DIR):
+    """
+    Build the (age band, kommun, category, year) cube of counts in one pass
+    over the extract, for every year in it.
+
+    Each chunk is summed by single year of age first; the bands are then
+    summed from that small result, so overlapping bands cost no extra passes.
+    """
+    all_ages = sorted(set().union(*(range(low, high + 1) for low, high in bands.values())))
+    group_cols = ['kommun_code', 'kommun', 'category', 'år']
+
+    totals = None
+    for chunk in iter_source_chunks(source, chunksize, use_cache, cache_dir, all_ages):
+        by_age = filter_chunk(chunk, all_ages, by=group_cols + ['ålder'])
+        ages = by_age.index.get_level_values('ålder')
+        grouped = pd.concat(
+            {band: by_age[(ages >= low) & (ages <= high)].groupby(level=group_cols).sum()
+             for band, (low, high) in bands.items()},
+            names=['band'],
+        )
+        totals = grouped if totals is None else totals.add(grouped, fill_value=0)
+
+    cube = totals.rename('count').reset_index()
+    cube['count'] = cube['count'].astype('int64')
+    return cube
+
+
+def label_positions(column, positions):
+    """
+    Position of each row's label in `positions` (label -> int), -1 for
+    labels it doesn't have. Looked up once per category, not per row.
+    """
+    column = column.astype('category')
+    table = np.array([positions.get(str(label), -1) for label in column.cat.categories] + [-1])
+    return table[column.cat.codes.to_numpy()]
+
+
+def build_age_blocks(source, chunksize=CHUNKSIZE, use_cache=True, cache_dir=CACHE_DIR):
+    """
+    Counts by single year of age, sex and category for every kommun, in one
+    pass over the extract: the kommun codes and {year: (kommun x age x sex
+    x category) array}, for age_pyramids.write_age_pyramids.
+    """
+    codes = np.asarray(swedish_index().codes('kommun'))
+    kommun_rows = {code: row for row, code in enumerate(codes)}
+    categories = list(CATEGORY_MAP)
+    shape = (len(codes), len(AGES), len(SEXES), len(categories))
+
+    blocks = {}
+    columns = SOURCE_COLUMNS + ['kön']
+    for chunk in iter_source_chunks(source, chunksize, use_cache, cache_dir, AGES,
+                                    columns=columns):
+        region_rows = {}
+        for region in chunk['region'].astype('category').cat.categories:
+            match = REGION.match(str(region))
+            if match and len(match.group(1)) == 4:
+                region_rows[str(region)] = kommun_rows.get(int(match.group(1)), -1)
+
+        row = label_positions(chunk['region'], region_rows)
+        sex = label_positions(chunk['kön'], {label: i for i, label in enumerate(SEXES)})
+        category = label_positions(chunk['utländsk/svensk bakgrund'],
+                                   {label: i for i, label in enumerate(categories)})
+        age = chunk['ålder'].to_numpy()
+        keep = (row >= 0) & (sex >= 0) & (category >= 0) & (age >= 0) & (age <= AGES[-1])
+
+        flat = np.ravel_multi_index((row[keep], age[keep], sex[keep], category[keep]), shape)
+        years = chunk['år'].to_numpy()[keep]
+        counts = chunk['Antal personer'].to_numpy()[keep]
+        for year in np.unique(years):
+            block = blocks.setdefault(int(year), np.zeros(np.prod(shape), dtype='int64'))
+            in_year = years == year
+            block += np.bincount(flat[in_year], weights=counts[in_year],
+                                 minlength=block.size).astype('int64')
+
+    return codes, {year: block.reshape(shape) for year, block in blocks.items()}
+
+
+def rollup_cube(cube):
+    """
+    The cube of kommuner (from build_cube) with the län and riket rows
+    summed from it, and a `level` column. A kommun's län is the first two
+    digits of its code.
+    """
+    keys = ['band', 'kommun_code', 'category', 'år']
+    kommuner = cube.assign(level='kommun')
+    lan = (cube.assign(kommun_code=cube['kommun_code'] // 100)
+           .groupby(keys, as_index=False)['count'].sum())
+    lan = lan.assign(kommun=lan['kommun_code'].map(SWEDISH_LAN), level='lan')
+    riket = (cube.groupby(['band', 'category', 'år'], as_index=False)['count'].sum()
+             .assign(kommun_code=RIKET[0], kommun=RIKET[1], level='riket'))
+
+    columns = ['band', 'level', 'kommun_code', 'kommun', 'category', 'år', 'count']
+    return pd.concat([kommuner, lan, riket], ignore_index=True)[columns]
+
+
+def load_cube(path=CUBE_FILE):
+    """Load a cube written by `process_demographic_data`."""
+    cube = pd.read_csv(path, encoding='utf-8')
+    if 'level' not in cube.columns:
+        raise ValueError(f"{path} has no län and riket rollups; reprocess the extract")
+    return cube
+
+
+def build_year_store(cube, band=DEFAULT_BAND):
+    """
+    Dense (region x category x year) array of counts for one age band, for
+    the app's time series. Rows are the codes of every level (riket 0, län,
+    kommuner) in ascending order,
+    categories follow CATEGORY_MAP and years ascend; absent cells are 0.
+    """
+    rows = cube[cube['band'] == band]
+    codes = rows['kommun_code'].to_numpy(dtype='int32')
+
+    kommun_codes, kommun_idx = np.unique(codes, return_inverse=True)
+    years, year_idx = np.unique(rows['år'].to_numpy(), return_inverse=True)
+    categories = list(CATEGORY_MAP.values())
+    category_idx = pd.Categorical(rows['category'], categories=categories).codes
+
+    counts = np.zeros((len(kommun_codes), len(categories), len(years)), dtype='int32')
+    counts[kommun_idx, category_idx, year_idx] = rows['count'].to_numpy()
+    return {
+        'codes': kommun_codes,
+        'categories': np.array(categories),
+        'years': years.astype('int16'),
+        'counts': counts,
+        'band': np.array(band),
     }
 
-    # Filter for working age (18-67) and years 2014, 2024
-    # First, let's see what age format looks like
-    print("Unique age values sample:")
-    print(df['ålder'].unique()[:20])
 
-    # We need to filter for ages 18-67
-    # The data has individual ages like "18 år", "19 år", etc.
-    working_ages = [f"{age} år" for age in range(18, 68)]
+def load_year_store(path=YEARS_FILE):
+    with np.load(path) as store:
+        return {key: store[key] for key in store.files}
 
-    df_filtered = df[
-        (df['ålder'].isin(working_ages)) &
-        (df['år'].isin([2014, 2024])) &
-        (df['utländsk/svensk bakgrund'].isin(category_map.keys()))
-    ].copy()
 
-    # Map category names
-    df_filtered['category'] = df_filtered['utländsk/svensk bakgrund'].map(category_map)
+def save_year_store(store, path=YEARS_FILE):
+    np.savez_compressed(path, **store)
+    print(f"Saved {store['counts'].shape} year store to {path}")
 
-    # Extract kommun name from region (format: "0114 Upplands Väsby")
-    df_filtered['kommun'] = df_filtered['region'].str.replace(r'^\d+\s+', '', regex=True)
 
-    # Remove national level ("Riket")
-    df_filtered = df_filtered[df_filtered['kommun'] != 'Riket']
+def extend_year_store(store, new):
+    """
+    The year store `store` with the years of `new` (same band and
+    categories) added. Kommuner only one of them has are 0 in the other's
+    years.
+    """
+    codes = np.union1d(store['codes'], new['codes'])
+    years = np.concatenate([store['years'], new['years']])
+    counts = np.zeros((len(codes), len(store['categories']), len(years)), dtype='int32')
+    n_old = len(store['years'])
+    counts[np.searchsorted(codes, store['codes']), :, :n_old] = store['counts']
+    counts[np.searchsorted(codes, new['codes']), :, n_old:] = new['counts']
+
+    order = np.argsort(years, kind='stable')
+    return {**store, 'codes': codes, 'years': years[order], 'counts': counts[:, :, order]}
+
+
+def read_manifest(path=MANIFEST_FILE):
+    """The loads recorded in the ingest manifest, oldest first ([] if there is none)."""
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['loads']
+
+
+def record_load(source, cube, mode, path=MANIFEST_FILE):
+    """
+    Add a load of `source` (its hash, the years and bands it brought into
+    the cube) to the manifest. A full load starts the manifest afresh.
+    """
+    loads = [] if mode == 'full' else read_manifest(path)
+    loads.append({
+        'source': Path(source).name,
+        'sha256': file_hash(source),
+        'mode': mode,
+        'years': sorted(int(year) for year in cube['år'].unique()),
+        'bands': sorted(cube['band'].unique()),
+        'rows': len(cube),
+        'ingested': datetime.now().isoformat(timespec='seconds'),
+    })
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'loads': loads}, f, ensure_ascii=False, indent=2)
 
-    # Group by kommun, category, and year, summing across gender and individual ages
-    df_grouped = df_filtered.groupby(
-        ['kommun', 'category', 'år'],
-        as_index=False
-    )['Antal personer'].sum()
 
-    # Pivot to get 2014 and 2024 as columns
+def derive_wide(cube, years=DEFAULT_YEARS, band=DEFAULT_BAND):
+    """
+    Derive the app's wide table (counts, change and percentages per category)
+    for one pair of years and one age band, straight from the cube: one row
+    per kommun, län and riket, with its `level`.
+    """
+    start, end = sorted(years)
+    if start == end:
+        raise ValueError(f"Need two different years to compare, got {start} twice")
+    available = set(cube.loc[cube['band'] == band, 'år'])
+    missing = [year for year in (start, end) if year not in available]
+    if not available:
+        raise ValueError(f"No data for band {band} in the cube")
+    if missing:
+        raise ValueError(f"No data for band {band} in year(s) {missing}; "
+                         f"the cube has {min(available)}-{max(available)}")
+
+    df_grouped = cube[(cube['band'] == band) & (cube['år'].isin([start, end]))]
+
+    # Pivot to get the two years as columns
     df_pivot = df_grouped.pivot_table(
-        index=['kommun', 'category'],
+        index=['kommun', 'kommun_code', 'level', 'category'],
         columns='år',
-        values='Antal personer',
+        values='count',
         fill_value=0
     ).reset_index()
 
-    df_pivot.columns = ['kommun', 'category', 'count_2014', 'count_2024']
+    count_start, count_end = f'count_{start}', f'count_{end}'
+    df_pivot.columns = ['kommun', 'kommun_code', 'level', 'category', count_start, count_end]
 
     # Calculate change
-    df_pivot['change_absolute'] = df_pivot['count_2024'] - df_pivot['count_2014']
+    df_pivot['change_absolute'] = df_pivot[count_end] - df_pivot[count_start]
     df_pivot['change_relative'] = (
-        (df_pivot['count_2024'] - df_pivot['count_2014']) /
-        df_pivot['count_2014'].replace(0, np.nan) * 100
+        (df_pivot[count_end] - df_pivot[count_start]) /
+        df_pivot[count_start].replace(0, np.nan) * 100
     )
 
     # Pivot wider to have each category as columns
     df_wide = df_pivot.pivot_table(
-        index='kommun',
+        index=['kommun', 'kommun_code', 'level'],
         columns='category',
-        values=['count_2014', 'count_2024', 'change_absolute', 'change_relative']
+        values=[count_start, count_end, 'change_absolute', 'change_relative']
     ).reset_index()
 
     # Flatten column names
     df_wide.columns = ['_'.join(col).strip('_') if col[1] else col[0]
                        for col in df_wide.columns.values]
 
+    # Integer SCB code of each region, which the app joins on, first
+    df_wide.insert(0, 'kommun_code', df_wide.pop('kommun_code'))
+
     # Calculate totals
-    category_cols_2014 = [col for col in df_wide.columns if col.startswith('count_2014_')]
-    category_cols_2024 = [col for col in df_wide.columns if col.startswith('count_2024_')]
+    total_start, total_end = f'total_{start}', f'total_{end}'
+    category_cols_start = [col for col in df_wide.columns if col.startswith(f'{count_start}_')]
+    category_cols_end = [col for col in df_wide.columns if col.startswith(f'{count_end}_')]
 
-    df_wide['total_2014'] = df_wide[category_cols_2014].sum(axis=1)
-    df_wide['total_2024'] = df_wide[category_cols_2024].sum(axis=1)
-    df_wide['total_change_absolute'] = df_wide['total_2024'] - df_wide['total_2014']
+    df_wide[total_start] = df_wide[category_cols_start].sum(axis=1)
+    df_wide[total_end] = df_wide[category_cols_end].sum(axis=1)
+    df_wide['total_change_absolute'] = df_wide[total_end] - df_wide[total_start]
     df_wide['total_change_relative'] = (
-        df_wide['total_change_absolute'] / df_wide['total_2014'].replace(0, np.nan) * 100
+        df_wide['total_change_absolute'] / df_wide[total_start].replace(0, np.nan) * 100
     )
 
-    # Calculate percentages for 2024
-    for category in category_map.values():
-        col_name = f'count_2024_{category}'
-        if col_name in df_wide.columns:
-            df_wide[f'pct_2024_{category}'] = (
-                df_wide[col_name] / df_wide['total_2024'] * 100
-            ).round(2)
-
-    # Calculate percentages for 2014
-    for category in category_map.values():
-        col_name = f'count_2014_{category}'
-        if col_name in df_wide.columns:
-            df_wide[f'pct_2014_{category}'] = (
-                df_wide[col_name] / df_wide['total_2014'] * 100
-            ).round(2)
+    # Calculate percentages for the end year, then the start year
+    for year in (end, start):
+        for category in CATEGORY_MAP.values():
+            col_name = f'count_{year}_{category}'
+            if col_name in df_wide.columns:
+                df_wide[f'pct_{year}_{category}'] = (
+                    df_wide[col_name] / df_wide[f'total_{year}'] * 100
+                ).round(2)
+
+    return df_wide
+
+
+def output_files(years=DEFAULT_YEARS, band=DEFAULT_BAND):
+    """
+    Wide table and subsets CSVs of a comparison. The app's own files hold
+    the default years and band, whose columns it reads; any other comparison
+    gets files named after it (processed_demographics_2016_2023_20-64.csv).
+    """
+    start, end = sorted(years)
+    if (start, end) == tuple(DEFAULT_YEARS) and band == DEFAULT_BAND:
+        return OUTPUT_FILE, SUBSETS_FILE
+    suffix = f"_{start}_{end}_{band}"
+    return (f"{Path(OUTPUT_FILE).stem}{suffix}.csv", f"{Path(SUBSETS_FILE).stem}{suffix}.csv")
+
+
+def subset_key(categories):
+    """Key of a combination of categories in the subsets table."""
+    return '+'.join(category for category in CATEGORY_MAP.values() if category in categories)
+
+
+def build_subset_table(df_wide, years=DEFAULT_YEARS):
+    """
+    Precompute the app's aggregated view for all 15 non-empty combinations of
+    the 4 categories, indexed by (subset, kommun_code).
+
+    The columns follow the app's formulas: the snapshot share of the end year,
+    the percentage point change (sum of rounded shares) and the relative change
+    of the summed counts.
+    """
+    start, end = sorted(years)
+    categories = list(CATEGORY_MAP.values())
+
+    frames = {}
+    for size in range(1, len(categories) + 1):
+        for subset in itertools.combinations(categories, size):
+            count_start = df_wide[[f'count_{start}_{cat}' for cat in subset]].sum(axis=1)
+            count_end = df_wide[[f'count_{end}_{cat}' for cat in subset]].sum(axis=1)
+            pct_start = df_wide[[f'pct_{start}_{cat}' for cat in subset]].sum(axis=1)
+            pct_end = df_wide[[f'pct_{end}_{cat}' for cat in subset]].sum(axis=1)
+
+            frames[subset_key(subset)] = pd.DataFrame({
+                'kommun_code': df_wide['kommun_code'],
+                'kommun': df_wide['kommun'],
+                f'count_{start}': count_start,
+                f'count_{end}': count_end,
+                f'pct_{end}': (count_end / df_wide[f'total_{end}'] * 100).round(2),
+                'change_pp': pct_end - pct_start,
+                'change_relative': (
+                    (count_end - count_start) / count_start.replace(0, 1) * 100
+                ).round(2),
+            })
+
+    return (
+        pd.concat(frames, names=['subset'])
+        .reset_index(level=0)
+        .set_index(['subset', 'kommun_code'])
+    )
+
+
+def process_demographic_data(source="TAB4824_sv.csv", years=DEFAULT_YEARS,
+                             band=DEFAULT_BAND, bands=AGE_BANDS, chunksize=CHUNKSIZE,
+                             use_cache=True, cache_dir=CACHE_DIR, from_cube=False,
+                             output=None, subsets_output=None, ages=True):
+    """
+    Process TAB4824_sv.csv to extract working age demographics by kommun for
+    a pair of years (default 2014 and 2024, ages 18-67), broken down by the
+    4 demographic categories.
+
+    One pass over the extract builds the cube of every year and age band in
+    `bands` for the kommuner, rolled up to län and riket (rollup_cube) and
+    saved as demographic_cube.csv. With from_cube=True that saved cube
+    is reused, so other year pairs and bands need no pass over the raw data.
+    The wide table goes to `output` and all 15 category combinations for the
+    aggregated view to `subsets_output`, by default the app's files for the
+    default years and band and separate ones otherwise (output_files). Every
+    year of the default band goes to the app's time series store,
+    demographic_years.npz. Unless ages=False, a second pass keeps the
+    single-year age and sex detail for the app's age pyramids
+    (age_pyramids.py, demographic_ages.bin).
+
+    The raw file is streamed in chunks of `chunksize` rows so that peak memory
+    stays flat as the input grows; pass chunksize=None to read it in one go.
+    After the first run the extract is read from a Parquet cache keyed on the
+    file's hash, unless use_cache=False.
+    """
+    if from_cube:
+        cube = load_cube(CUBE_FILE)
+    else:
+        if band not in bands:
+            bands = {**bands, band: parse_band(band)}
+        cube = rollup_cube(build_cube(source, bands, chunksize, use_cache, cache_dir))
+        cube.to_csv(CUBE_FILE, index=False, encoding='utf-8')
+        record_load(source, cube, 'full')
+        print(f"Saved cube with {len(cube)} rows to {CUBE_FILE}")
+        if ages:
+            write_age_pyramids(*build_age_blocks(source, chunksize, use_cache, cache_dir),
+                               categories=CATEGORY_MAP.values(), path=AGES_FILE,
+                               index_path=AGES_INDEX_FILE)
+
+    df_wide = derive_wide(cube, years, band)
+    default_output, default_subsets = output_files(years, band)
+    output, subsets_output = output or default_output, subsets_output or default_subsets
+    # The time series shows the app's band, whichever band was derived
+    save_year_store(build_year_store(cube, DEFAULT_BAND))
 
     # Save processed data
-    df_wide.to_csv("processed_demographics.csv", index=False, encoding='utf-8')
+    df_wide.to_csv(output, index=False, encoding='utf-8')
+    build_subset_table(df_wide, years).to_csv(subsets_output, encoding='utf-8')
+    print(f"Saved {output} and {subsets_output}")
     print(f"Processed data for {len(df_wide)} kommuner")
     print(f"\nColumns: {list(df_wide.columns)}")
     print(f"\nSample data:")
@@ -114,5 +633,126 @@ def process_demographic_data():
 
     return df_wide
 
+
+def append_extract(source, chunksize=CHUNKSIZE, cube_path=CUBE_FILE, years_path=YEARS_FILE,
+                   manifest_path=MANIFEST_FILE):
+    """
+    Add the years in `source`, an extract of only the new year(s) such as
+    SCB's next yearly release, to the saved cube and year store.
+
+    Only `source` is read, once and without a Parquet cache, for the age
+    bands already in the cube; its rows are appended to the cube and its
+    years added to the year store. The years already there, and the wide
+    and subsets tables derived from them, are left as they are. The load is
+    recorded in the manifest. A source that was already ingested, or one
+    with a year the cube already has, is refused before anything is written.
+    """
+    loads = read_manifest(manifest_path)
+    if not loads:
+        raise ValueError(f"No {manifest_path} to append to; process a full extract first")
+
+    digest = file_hash(source)
+    for load in loads:
+        if load['sha256'] == digest:
+            raise ValueError(f"{source} was already ingested on {load['ingested']} "
+                             f"(as {load['source']})")
+
+    bands = {band: parse_band(band) for band in loads[0]['bands']}
+    cube = rollup_cube(build_cube(source, bands, chunksize, use_cache=False))
+    ingested = {year for load in loads for year in load['years']}
+    overlap = sorted(set(cube['år'].unique().tolist()) & ingested)
+    if overlap:
+        raise ValueError(f"{source} has year(s) already ingested: {overlap}; "
+                         f"reprocess the full extract to revise them")
+
+    store = load_year_store(years_path)
+    store = extend_year_store(store, build_year_store(cube, str(store['band'])))
+
+    # The age pyramids, if kept, get the new years too: one more pass over
+    # the new extract only
+    age_blocks = None
+    if Path(AGES_INDEX_FILE).exists():
+        age_blocks = build_age_blocks(source, chunksize, use_cache=False)
+
+    # Same column order as the saved cube, appended below it
+    columns = pd.read_csv(cube_path, nrows=0).columns
+    cube[columns].to_csv(cube_path, mode='a', header=False, index=False, encoding='utf-8')
+    save_year_store(store, years_path)
+    if age_blocks is not None:
+        write_age_pyramids(*age_blocks, categories=CATEGORY_MAP.values(), path=AGES_FILE,
+                           index_path=AGES_INDEX_FILE, append=True)
+    record_load(source, cube, 'append', manifest_path)
+
+    years = sorted(cube['år'].unique().tolist())
+    print(f"Appended {len(cube)} rows for {years} to {cube_path}")
+    print(f"To compare against a new year: python3 process_data.py --from-cube "
+          f"--years {DEFAULT_YEARS[0]} {years[-1]}")
+    return cube
+
+
 if __name__ == "__main__":
-    df = process_demographic_data()
+    parser = argparse.ArgumentParser(description="Process the SCB TAB4824 extract for the app.")
+    parser.add_argument("source", nargs="?", default="TAB4824_sv.csv",
+                        help="Raw SCB extract (default: TAB4824_sv.csv)")
+    parser.add_argument("--years", nargs=2, type=int, default=list(DEFAULT_YEARS),
+                        metavar=("START", "END"),
+                        help="Pair of years to compare (default: 2014 2024)")
+    parser.add_argument("--band", default=DEFAULT_BAND,
+                        help=f"Age band, e.g. 20-64 (default: {DEFAULT_BAND})")
+    parser.add_argument("--from-cube", action="store_true",
+                        help=f"Derive the output from {CUBE_FILE} without reading the extract")
+    parser.add_argument("-o", "--output", default=None,
+                        help=f"Output CSV (default: {OUTPUT_FILE} for the default years and "
+                             f"band, else named after them)")
+    parser.add_argument("--append", action="store_true",
+                        help=f"Add the new year(s) in SOURCE to {CUBE_FILE} and {YEARS_FILE}, "
+                             f"leaving the years already processed untouched")
+    parser.add_argument("--subsets-only", action="store_true",
+                        help=f"Only rebuild {SUBSETS_FILE} from an existing output CSV")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE,
+                        help=f"Rows per chunk when streaming the extract (default: {CHUNKSIZE})")
+    parser.add_argument("--no-streaming", action="store_true",
+                        help="Read the whole extract into memory at once")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Parse the CSV instead of using (or building) the Parquet cache")
+    parser.add_argument("--cache-dir", default=CACHE_DIR,
+                        help=f"Where the Parquet cache is kept (default: {CACHE_DIR})")
+    parser.add_argument("--no-ages", action="store_true",
+                        help="Skip the single-year age file behind the app's age pyramids")
+    args = parser.parse_args()
+    if args.years[0] == args.years[1]:
+        parser.error(f"--years needs two different years, got {args.years[0]} twice")
+
+    # The app reads its files' columns for the default comparison only
+    app_output = output_files()[0]
+    if (args.output and Path(args.output).resolve() == Path(app_output).resolve()
+            and output_files(args.years, args.band)[0] != app_output):
+        parser.error(f"{app_output} is the app's input and must hold {DEFAULT_YEARS[0]}-"
+                     f"{DEFAULT_YEARS[1]} for {DEFAULT_BAND}; pick another --output")
+    output, subsets_output = output_files(args.years, args.band)
+    output = args.output or output
+
+    if args.append:
+        append_extract(args.source, chunksize=None if args.no_streaming else args.chunksize)
+    elif args.subsets_only:
+        df = pd.read_csv(output, encoding='utf-8')
+        build_subset_table(df, args.years).to_csv(subsets_output, encoding='utf-8')
+        print(f"Saved {subsets_output}")
+    else:
+        df = process_demographic_data(
+            args.source,
+            years=args.years,
+            band=args.band,
+            from_cube=args.from_cube,
+            output=output,
+            subsets_output=subsets_output,
+            chunksize=None if args.no_streaming else args.chunksize,
+            use_cache=not args.no_cache,
+            cache_dir=args.cache_dir,
+            ages=not args.no_ages,
+        )
+
+    # The app starts from the pre-merged bundle of its own data files, which
+    # an append leaves unchanged
+    if not args.append and Path(output).resolve() == DEMOGRAPHICS_FILE.resolve():
+        write_bundle()
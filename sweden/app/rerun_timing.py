@@ -0,0 +1,194 @@
+"""
+Per-stage timing of app.py reruns
+
+Every rerun of the app is timed as a series of laps: `start()` opens the
+rerun's record, each `lap(stage)` closes the stage that ran since the
+previous lap, and `finish()` writes the record as one JSON line to
+`rerun_timings.jsonl`:
+
+    {"time": "2025-03-01T12:00:00+00:00", "session": "3f2a9c1b7d4e",
+     "rerun": 4, "changed": ["level"], "state": {...}, "total_ms": 182.4,
+     "rss_mb": 412.3, "peak_rss_mb": 430.1,
+     "stages": {"load_data": {"ms": 0.3, "rss_mb": 410.2, "rss_delta_mb": 0.0},
+                "view": {"ms": 120.7, ..., "cached": false}, ...}}
+
+Memory is the resident size of the whole server process, so it is shared by
+every session; a stage's delta is what the process grew by while it ran.
+The current size is read from /proc and is None where there is none (macOS,
+Windows); the peak is None where the `resource` module is missing (Windows).
+The log rotates at LOG_BYTES. The most recent RECENT_RERUNS records are also
+kept in memory for the percentiles of the app's admin panel.
+
+Laps are bound to the thread running the rerun, so code the app calls
+(build_view, say) can record its own stages without being handed the
+timer. Outside a timed rerun, `lap` does nothing.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+import warnings
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+APP_DIR = Path(__file__).parent
+TIMING_LOG_FILE = APP_DIR / "rerun_timings.jsonl"
+
+# Size at which the log rotates, and the rotated files kept
+LOG_BYTES = 5_000_000
+LOG_BACKUPS = 3
+
+# Reruns kept in memory for the percentiles
+RECENT_RERUNS = 1000
+PERCENTILES = (50, 90, 99)
+
+PAGE_BYTES = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+_active = threading.local()
+_recent = deque(maxlen=RECENT_RERUNS)
+_lock = threading.Lock()
+
+
+def peak_rss_mb():
+    """Peak resident memory of the process in MB, or None without `resource`."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB on Linux and the BSDs
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def rss_mb():
+    """Current resident memory of the process in MB, or None without /proc."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_BYTES / 2**20
+    except OSError:
+        return None
+
+
+def round_mb(mb):
+    return None if mb is None else round(mb, 1) + 0.0  # 0.0, not -0.0
+
+
+def timing_logger(path=TIMING_LOG_FILE):
+    """
+    The logger the records are written to, set up on first use. A log that
+    can't be opened (a read-only deployment, say) is warned about once and
+    the records are only kept in memory.
+    """
+    logger = logging.getLogger("rerun_timing")
+    if not logger.handlers:
+        try:
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=LOG_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+        except OSError as e:
+            warnings.warn(f"Can't write rerun timings to {path}: {e}")
+            handler = logging.NullHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+class RerunTimer:
+    """The stages of one rerun, timed lap by lap."""
+
+    def __init__(self, session, rerun):
+        self.session = session
+        self.rerun = rerun
+        self.stages = {}
+        self.started = self.last = time.perf_counter()
+        self.last_rss = rss_mb()
+
+    def lap(self, stage, **detail):
+        """Close `stage`: the time and memory since the previous lap, plus `detail`."""
+        now, rss = time.perf_counter(), rss_mb()
+        self.stages[stage] = {
+            "ms": round((now - self.last) * 1000, 2),
+            "rss_mb": round_mb(rss),
+            "rss_delta_mb": round_mb(None if rss is None else rss - self.last_rss),
+            **detail,
+        }
+        self.last, self.last_rss = now, rss
+
+    def record(self, **fields):
+        return {
+            "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "session": self.session,
+            "rerun": self.rerun,
+            **fields,
+            "total_ms": round((self.last - self.started) * 1000, 2),
+            "rss_mb": round_mb(self.last_rss),
+            "peak_rss_mb": round_mb(peak_rss_mb()),
+            "stages": self.stages,
+        }
+
+
+def start(session, rerun):
+    """Start timing a rerun on this thread; returns its timer."""
+    _active.timer = RerunTimer(session, rerun)
+    return _active.timer
+
+
+def lap(stage, **detail):
+    """Close `stage` of the rerun timed on this thread, if any."""
+    timer = getattr(_active, "timer", None)
+    if timer is not None:
+        timer.lap(stage, **detail)
+
+
+def finish(path=TIMING_LOG_FILE, **fields):
+    """
+    Write the record of the rerun timed on this thread, with `fields` (the
+    interaction, say), to the log and the recent reruns. Returns it.
+    """
+    timer = getattr(_active, "timer", None)
+    if timer is None:
+        return None
+    _active.timer = None
+    record = timer.record(**fields)
+    timing_logger(path).info(json.dumps(record, ensure_ascii=False))
+    with _lock:
+        _recent.append(record)
+    return record
+
+
+def recent():
+    """The records of the last RECENT_RERUNS reruns of this process, oldest first."""
+    with _lock:
+        return list(_recent)
+
+
+def recent_percentiles(percentiles=PERCENTILES):
+    """
+    Milliseconds per stage over the recent reruns of this process: the
+    number of reruns that ran the stage, its percentiles and maximum, with
+    the whole rerun as "total".
+    """
+    records = recent()
+    times = {"total": [record["total_ms"] for record in records]}
+    for record in records:
+        for stage, timing in record["stages"].items():
+            times.setdefault(stage, []).append(timing["ms"])
+
+    rows = {}
+    for stage, values in times.items():
+        if values:
+            rows[stage] = {"reruns": len(values),
+                           **{f"p{p}": np.percentile(values, p) for p in percentiles},
+                           "max": max(values)}
+    return pd.DataFrame.from_dict(rows, orient="index").round(1)
@@ -0,0 +1,163 @@
+"""
+Build simplified versions of swedish_municipalities.geojson for the app's map
+
+Each level is simplified as a polygon coverage: shared borders between
+neighbouring kommuner are simplified once and identically on both sides
+(like the shared arcs of TopoJSON), so no gaps or overlaps appear.
+
+The län and riket boundaries are dissolved from the kommuner of every file,
+full resolution and simplified, and saved next to them
+(swedish_lan_z3.5.geojson, ...). A län border is then exactly the kommun
+borders it follows, and the app switches level without unioning polygons.
+"""
+import argparse
+import json
+import math
+from pathlib import Path
+
+APP_DIR = Path(__file__).parent
+SOURCE = APP_DIR / "swedish_municipalities.geojson"
+
+# Dissolved boundaries of the levels above the kommun, and the code and name
+# of each of their features given a kommun code
+LAN_SOURCE = APP_DIR / "swedish_lan.geojson"
+RIKET_SOURCE = APP_DIR / "swedish_riket.geojson"
+RIKET = (0, "Riket")
+
+# Map zoom levels to build a simplified file for. A level is detailed enough
+# for any zoom up to and including its own.
+ZOOM_LEVELS = [3.5, 5, 7]
+
+# Simplification tolerance as a fraction of a screen pixel
+PIXEL_FRACTION = 0.5
+
+
+def degrees_per_pixel(zoom):
+    """Width of one screen pixel in degrees of longitude at a web map zoom."""
+    return 360 / (256 * 2 ** zoom)
+
+
+def level_path(zoom, source=SOURCE):
+    """File holding the geometry simplified for `zoom`."""
+    source = Path(source)
+    return source.with_name(f"{source.stem}_z{zoom:g}{source.suffix}")
+
+
+def pick_level(zoom, source=SOURCE):
+    """
+    Coarsest available geometry that is still detailed enough for `zoom`,
+    falling back to the full resolution file.
+    """
+    for level in sorted(ZOOM_LEVELS):
+        if level >= zoom and level_path(level, source).exists():
+            return level_path(level, source)
+    return Path(source)
+
+
+def _round_coords(coords, digits):
+    if isinstance(coords[0], (int, float)):
+        return [round(value, digits) for value in coords]
+    return [_round_coords(part, digits) for part in coords]
+
+
+def build_levels(source=SOURCE, zoom_levels=ZOOM_LEVELS):
+    """Write one coverage-simplified GeoJSON per zoom level."""
+    # Only needed at build time, the app reads the finished files
+    import shapely
+
+    with open(source, encoding="utf-8") as f:
+        geojson = json.load(f)
+    geometries = [shapely.geometry.shape(feature["geometry"]) for feature in geojson["features"]]
+
+    for zoom in zoom_levels:
+        tolerance = degrees_per_pixel(zoom) * PIXEL_FRACTION
+        # Rounding to well below the tolerance keeps the files small without
+        # moving shared vertices apart
+        digits = max(0, math.ceil(-math.log10(tolerance / 100)))
+
+        simplified = shapely.coverage_simplify(geometries, tolerance)
+        features = [
+            {**feature, "geometry": {**shapely.geometry.mapping(geometry),
+                                     "coordinates": _round_coords(
+                                         shapely.geometry.mapping(geometry)["coordinates"], digits)}}
+            for feature, geometry in zip(geojson["features"], simplified)
+        ]
+
+        out_path = level_path(zoom, source)
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump({**geojson, "features": features}, f, ensure_ascii=False,
+                      separators=(",", ":"))
+
+        vertices = shapely.get_num_coordinates(simplified).sum()
+        print(f"Zoom {zoom:g}: tolerance {tolerance:.4f}°, {vertices:,} vertices, "
+              f"{out_path.stat().st_size / 1024:,.0f} KB -> {out_path.name}")
+
+
+def dissolve(geojson, group):
+    """
+    Features of `geojson` dissolved by `group(kommun code)` -> (code, name),
+    as {"id", "name"} features in code order.
+    """
+    import shapely
+
+    groups = {}
+    for feature in geojson["features"]:
+        code, name = group(int(feature["properties"]["id"]))
+        groups.setdefault((code, name), []).append(shapely.geometry.shape(feature["geometry"]))
+
+    def union(parts):
+        # The kommuner form a coverage, so usually the union only has to drop
+        # shared edges; rounded coordinates can leave it incorrectly noded
+        try:
+            return shapely.coverage_union_all(parts)
+        except shapely.errors.GEOSException:
+            return shapely.union_all(parts)
+
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature",
+             "properties": {"id": f"{code:02d}", "name": name},
+             "geometry": shapely.geometry.mapping(union(parts))}
+            for (code, name), parts in sorted(groups.items())
+        ],
+    }
+
+
+def dissolve_levels(source=SOURCE, zoom_levels=ZOOM_LEVELS):
+    """
+    Write the län and riket boundaries dissolved from `source` and from
+    each of its simplified levels.
+    """
+    # The län names live with the municipality index at the repo root
+    import sys
+    sys.path.append(str(Path(__file__).resolve().parents[2]))
+    from municipalities import SWEDISH_LAN
+
+    levels = {
+        LAN_SOURCE: lambda code: (code // 100, SWEDISH_LAN[code // 100]),
+        RIKET_SOURCE: lambda code: RIKET,
+    }
+    inputs = [(source, None)] + [(level_path(zoom, source), zoom) for zoom in zoom_levels
+                                 if level_path(zoom, source).exists()]
+    for path, zoom in inputs:
+        with open(path, encoding="utf-8") as f:
+            geojson = json.load(f)
+        for target, group in levels.items():
+            out_path = target if zoom is None else level_path(zoom, target)
+            with open(out_path, "w", encoding="utf-8") as f:
+                json.dump(dissolve(geojson, group), f, ensure_ascii=False, separators=(",", ":"))
+            print(f"Dissolved {path.name} -> {out_path.name} "
+                  f"({out_path.stat().st_size / 1024:,.0f} KB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("source", nargs="?", type=Path, default=SOURCE,
+                        help="Full resolution GeoJSON (default: swedish_municipalities.geojson)")
+    parser.add_argument("--zoom", nargs="*", type=float, default=ZOOM_LEVELS,
+                        help="Zoom levels to build (default: 3.5 5 7)")
+    args = parser.parse_args()
+
+    build_levels(args.source, args.zoom)
+    dissolve_levels(args.source, args.zoom)
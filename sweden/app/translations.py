@@ -0,0 +1,128 @@
+"""
+Interface text of the explorer in English and Swedish, shared by app.py and
+the static export (export_static.py)
+"""
+TRANSLATIONS = {
+    "en": {
+        "title": "🇸🇪 Swedish Demographic Change Explorer",
+        "settings": "Settings",
+        "language": "Language",
+        "view_type": "View Type",
+        "snapshot": "Current Snapshot (2024)",
+        "change": "Change Over Time (2014-2024)",
+        "time_series": "Every Year (time series)",
+        "year": "Year",
+        "play": "▶ Play",
+        "born_overseas": "Born overseas",
+        "both_parents_overseas": "Both parents born overseas (born in Sweden)",
+        "one_parent_overseas": "One parent born overseas (born in Sweden)",
+        "both_parents_sweden": "Both parents born in Sweden",
+        "show_aggregated": "Show aggregated view",
+        "aggregated_categories": "**Aggregated categories:**",
+        "select_categories": "Select categories to combine",
+        "select_category": "Select demographic category",
+        "error_select_one": "Please select at least one category",
+        "foreign_background": "Foreign background",
+        "change_metric": "Change metric",
+        "percentage_points": "Percentage points",
+        "relative_change": "Relative percent change",
+        "percentage_of_pop": "Percentage of Working Age Population (2024)",
+        "percentage_of_pop_year": "Percentage of Working Age Population ({year})",
+        "change_pp": "Change in Percentage Points (2024-2014)",
+        "relative_change_title": "Relative Change (2024-2014)",
+        "percentage": "Percentage (%)",
+        "percent_change": "Percent Change (%)",
+        "key_stats": "Key Statistics",
+        "population_2024": "2024 Population",
+        "population_2014": "2014 Population",
+        "absolute_change": "Absolute Change",
+        "relative_change_stat": "Relative Change",
+        "of_working_age": "of working age",
+        "top_bottom": "Top & Bottom Kommuner",
+        "top_10": "Top 10 Kommuner",
+        "bottom_10": "Bottom 10 Kommuner",
+        "kommun": "Kommun",
+        "level": "Level",
+        "level_kommun": "Kommuner",
+        "level_lan": "Län (counties)",
+        "level_riket": "Sweden",
+        "top_bottom_lan": "Top & Bottom Län",
+        "top_10_lan": "Top 10 Län",
+        "bottom_10_lan": "Bottom 10 Län",
+        "lan": "Län",
+        "age_pyramid": "Age Pyramid",
+        "click_for_pyramid": "Click a region on the map to see its population by age, sex and background.",
+        "men": "Men",
+        "women": "Women",
+        "age": "Age",
+        "age_unit": "years",
+        "change_label": "Change",
+        "data_source": "**Data Source:** Statistics Sweden (SCB) - TAB4824",
+        "working_age_def": "**Working Age Definition:** 18-67 years",
+        "time_period": "**Time Period:** 2014-2024",
+        "license_text": "This work is licensed under a [Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International License](https://creativecommons.org/licenses/by-nc-sa/4.0/).",
+        "total_2024": "Total 2024",
+        "total_2014": "Total 2014"
+    },
+    "sv": {
+        "title": "🇸🇪 Demografisk förändring i Sverige",
+        "settings": "Inställningar",
+        "language": "Språk",
+        "view_type": "Visningstyp",
+        "snapshot": "Nuläge (2024)",
+        "change": "Förändring över tid (2014-2024)",
+        "time_series": "Varje år (tidsserie)",
+        "year": "År",
+        "play": "▶ Spela upp",
+        "born_overseas": "Födda utomlands",
+        "both_parents_overseas": "Båda föräldrarna födda utomlands (födda i Sverige)",
+        "one_parent_overseas": "En förälder född utomlands (födda i Sverige)",
+        "both_parents_sweden": "Båda föräldrarna födda i Sverige",
+        "show_aggregated": "Visa aggregerad vy",
+        "aggregated_categories": "**Aggregerade kategorier:**",
+        "select_categories": "Välj kategorier att kombinera",
+        "select_category": "Välj demografisk kategori",
+        "error_select_one": "Välj minst en kategori",
+        "foreign_background": "Utländsk bakgrund",
+        "change_metric": "Förändringsenhet",
+        "percentage_points": "Procentenheter",
+        "relative_change": "Relativ procentuell förändring",
+        "percentage_of_pop": "Andel av befolkningen i arbetsför ålder (2024)",
+        "percentage_of_pop_year": "Andel av befolkningen i arbetsför ålder ({year})",
+        "change_pp": "Förändring i procentenheter (2024-2014)",
+        "relative_change_title": "Relativ förändring (2024-2014)",
+        "percentage": "Procent (%)",
+        "percent_change": "Procentuell förändring (%)",
+        "key_stats": "Nyckelstatistik",
+        "population_2024": "Befolkning 2024",
+        "population_2014": "Befolkning 2014",
+        "absolute_change": "Absolut förändring",
+        "relative_change_stat": "Relativ förändring",
+        "of_working_age": "av arbetsför ålder",
+        "top_bottom": "Högsta & lägsta kommuner",
+        "top_10": "Topp 10 kommuner",
+        "bottom_10": "Botten 10 kommuner",
+        "kommun": "Kommun",
+        "level": "Nivå",
+        "level_kommun": "Kommuner",
+        "level_lan": "Län",
+        "level_riket": "Riket",
+        "top_bottom_lan": "Högsta & lägsta län",
+        "top_10_lan": "Topp 10 län",
+        "bottom_10_lan": "Botten 10 län",
+        "lan": "Län",
+        "age_pyramid": "Ålderspyramid",
+        "click_for_pyramid": "Klicka på ett område på kartan för att se befolkningen efter ålder, kön och bakgrund.",
+        "men": "Män",
+        "women": "Kvinnor",
+        "age": "Ålder",
+        "age_unit": "år",
+        "change_label": "Förändring",
+        "data_source": "**Datakälla:** Statistiska centralbyrån (SCB) - TAB4824",
+        "working_age_def": "**Definition av arbetsför ålder:** 18-67 år",
+        "time_period": "**Tidsperiod:** 2014-2024",
+        "license_text": "Detta verk är licensierat under en [Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International License](https://creativecommons.org/licenses/by-nc-sa/4.0/).",
+        "total_2024": "Totalt 2024",
+        "total_2014": "Totalt 2014"
+    }
+}
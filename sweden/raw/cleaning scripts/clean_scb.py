@@ -0,0 +1,197 @@
+"""
+Clean the SCB exports in sweden/raw into one combined, typed table
+
+Each input is described declaratively in INPUTS (which column holds the
+region, group, age, year and value); all inputs are read concurrently and
+written as a single long table that keeps the numeric kommun code as the
+join key. The per-input files the Swedish notebook and typology_sweep.py
+read (change_clean.csv and friends, see LEGACY_OUTPUTS) are written from
+that table alongside it.
+"""
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+# Unmatched rows are reported like the municipality index at the repo root does
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from municipalities import report_unmatched
+
+RAW_DIR = Path(__file__).resolve().parent.parent
+OUTPUT = RAW_DIR / "scb_clean.csv"
+
+# One entry per export. Values name the columns in the export's header;
+# None means the export has no such column.
+INPUTS = {
+    "population": {
+        "file": "change_raw.csv",
+        "region": "region",
+        "group": None,
+        "age": None,
+        "year": "månad",  # "2014M12"
+        "value": "Folkmängden per månad, antal",
+    },
+    "foreign": {
+        "file": "change_foreign.csv",
+        "region": "region",
+        "group": "utländsk/svensk bakgrund",
+        "age": "ålder",
+        "year": "år",
+        "value": "Antal personer",
+    },
+    "swedish": {
+        "file": "change_swedes.csv",
+        "region": "region",
+        "group": "utländsk/svensk bakgrund",
+        "age": "ålder",
+        "year": "år",
+        "value": "Antal personer",
+    },
+    "foreign_percent": {
+        "file": "foreigner_percent.csv",
+        "region": "region",
+        "group": "utländsk/svensk bakgrund",
+        "age": "ålder",
+        "year": "år",
+        "value": "Antal personer",  # holds a percentage in this export
+    },
+}
+
+# Column types of the combined table
+DTYPES = {
+    "input": "category",
+    "kommun_code": "int16",
+    "kommun": "category",
+    "level": "category",
+    "group": "category",
+    "age": "category",
+    "year": "int16",
+    "value": "float64",
+}
+
+# Per-input files derived from the combined table for the notebook and
+# typology_sweep.py: file -> (input, value column, what it holds). "change"
+# is the 2014-2024 change per kommun, "value" the kommun's value in the
+# input's last year.
+LEGACY_OUTPUTS = {
+    "change_clean.csv": ("population", "Change", "change"),
+    "change_swedes_clean.csv": ("swedish", "change", "change"),
+    "change_foreign_clean.csv": ("foreign", "change", "change"),
+    "foreigner_percent_clean.csv": ("foreign_percent", "percent", "value"),
+}
+
+# Region code length -> geographic level
+LEVELS = {4: "kommun", 2: "lan"}
+
+
+def split_region(regions):
+    """
+    Split SCB region labels ("0114 Upplands Väsby") into numeric code, name
+    and level, once per distinct label. Labels without a code (totals,
+    footnotes) get a missing code.
+    """
+    unique = pd.Series(regions.unique())
+    parts = unique.str.extract(r'^(\d+)\s+(.*)$')
+    lookup = pd.DataFrame({
+        "kommun_code": pd.to_numeric(parts[0]),
+        "kommun": parts[1].str.strip(),
+        "level": parts[0].str.len().map(LEVELS).fillna("riket"),
+    })
+    lookup.index = unique
+    return lookup.loc[regions].reset_index(drop=True)
+
+
+def clean_input(name, spec, raw_dir=RAW_DIR):
+    """Read one export and return it in the combined long format."""
+    raw = pd.read_csv(raw_dir / spec["file"], encoding="iso-8859-1", dtype=str)
+
+    # Rows whose region isn't a coded region are reported and dropped
+    region = split_region(raw[spec["region"]])
+    coded = region["kommun_code"].notna().to_numpy()
+    report_unmatched(raw.loc[~coded, spec["region"]], f"region labels in {spec['file']}")
+    raw, region = raw[coded].reset_index(drop=True), region[coded].reset_index(drop=True)
+    clean = pd.DataFrame({
+        "input": name,
+        "kommun_code": region["kommun_code"],
+        "kommun": region["kommun"],
+        "level": region["level"],
+        "group": raw[spec["group"]] if spec["group"] else "",
+        "age": raw[spec["age"]] if spec["age"] else "",
+        # Years come as "2014" or as months like "2014M12"
+        "year": raw[spec["year"]].str[:4],
+        "value": pd.to_numeric(raw[spec["value"]], errors="coerce"),
+    })
+    return clean
+
+
+def clean_all(inputs=INPUTS, raw_dir=RAW_DIR, workers=None):
+    """Clean every input concurrently and combine them into one typed table."""
+    with ThreadPoolExecutor(max_workers=workers or len(inputs)) as pool:
+        futures = {name: pool.submit(clean_input, name, spec, raw_dir)
+                   for name, spec in inputs.items()}
+        frames = [future.result() for future in futures.values()]
+    return pd.concat(frames, ignore_index=True).astype(DTYPES)
+
+
+def read_clean(path=OUTPUT):
+    """Load the combined table with its column types."""
+    return pd.read_csv(path, encoding="utf-8", dtype=DTYPES, keep_default_na=False,
+                       na_values={"value": [""]})
+
+
+def change_table(clean, start=2014, end=2024, inputs=("population", "swedish", "foreign")):
+    """
+    Change between two years per kommun, one column per input, keyed on the
+    kommun code (the old per-input *_clean.csv files, merged).
+    """
+    subset = clean[clean["input"].isin(inputs) & (clean["level"] == "kommun")]
+    levels = subset.pivot_table(index=["kommun_code", "kommun"], columns=["input", "year"],
+                                values="value", aggfunc="sum", observed=True)
+    change = pd.DataFrame({name: levels[(name, end)] - levels[(name, start)] for name in inputs})
+    return change.reset_index()
+
+
+def legacy_tables(clean):
+    """The LEGACY_OUTPUTS of the inputs in `clean`: {file: (kommun, value) table}."""
+    kommuner = clean[clean["level"] == "kommun"]
+    tables = {}
+    for file, (name, column, kind) in LEGACY_OUTPUTS.items():
+        rows = kommuner[kommuner["input"] == name]
+        if rows.empty:
+            continue
+        if kind == "change":
+            table = change_table(clean, inputs=(name,)).dropna(subset=[name])
+            table[column] = table[name].astype("int64")
+        else:
+            table = rows[rows["year"] == rows["year"].max()].rename(columns={"value": column})
+        tables[file] = table[["kommun", column]].astype({"kommun": str}).sort_values("kommun")
+    return tables
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--raw-dir", type=Path, default=RAW_DIR,
+                        help="Folder with the SCB exports (default: sweden/raw)")
+    parser.add_argument("-o", "--output", type=Path, default=OUTPUT,
+                        help="Combined output CSV (default: sweden/raw/scb_clean.csv)")
+    parser.add_argument("--only", nargs="*", choices=list(INPUTS), default=None,
+                        help="Only clean these inputs")
+    parser.add_argument("--no-legacy", action="store_true",
+                        help="Don't write the per-input *_clean.csv files next to the output")
+    args = parser.parse_args()
+
+    inputs = {name: INPUTS[name] for name in (args.only or INPUTS)}
+    clean = clean_all(inputs, args.raw_dir)
+    clean.to_csv(args.output, index=False, encoding="utf-8")
+
+    print(f"Processing complete! Created {args.output}")
+    for name, count in clean.groupby("input", observed=True)["kommun_code"].nunique().items():
+        print(f"  {name}: {count} regions")
+
+    if not args.no_legacy:
+        for file, table in legacy_tables(clean).items():
+            path = args.output.parent / file
+            table.to_csv(path, index=False, encoding="utf-8")
+            print(f"Created {path} ({len(table)} kommuner)")
@@ -0,0 +1,102 @@
+"""
+Generate a synthetic SCB extract shaped like sweden/app/TAB4824_sv.csv
+
+Same columns, labels, encoding and quoting as the real extract: every
+region (riket, län and kommun, with real codes and names), background, age
+and sex for each year, with random counts. At scale 1 it has about as many
+rows as TAB4824 (~8 million rows, ~470 MB). Smaller scales keep an even
+spread of fewer regions and larger ones add earlier years, so 2014 and
+2024 are always present and process_data.py runs on it unchanged:
+
+    python synthetic_scb.py 0.05 -o /tmp/TAB4824_sv.csv
+    python synthetic_scb.py 20 -o /data/TAB4824_20x.csv
+"""
+import argparse
+import csv
+import itertools
+from pathlib import Path
+
+import numpy as np
+
+from municipalities import swedish_index
+
+# Labels of the "utländsk/svensk bakgrund" column: the four categories of
+# process_data.CATEGORY_MAP plus the total
+BACKGROUNDS = [
+    "utrikes födda",
+    "inrikes födda med två utrikes födda föräldrar",
+    "inrikes födda med en inrikes och en utrikes född förälder",
+    "inrikes födda med två inrikes födda föräldrar",
+    "totalt",
+]
+AGES = [f"{age} år" for age in range(100)] + ["100+ år", "totalt ålder"]
+SEXES = ["män", "kvinnor"]
+HEADER = ["region", "utländsk/svensk bakgrund", "ålder", "kön", "år", "Antal personer"]
+
+# Years of the extract at scale 1; larger scales extend it backwards
+LAST_YEAR = 2024
+BASE_YEARS = 25
+
+
+def regions():
+    """SCB region labels: riket, then every län and kommun ("0114 Upplands Väsby")."""
+    index = swedish_index()
+    labels = ["00 Riket"]
+    for code in index.codes("lan"):
+        labels.append(f"{code:02d} {index.name(code)}")
+    for code in index.codes("kommun"):
+        labels.append(f"{code:04d} {index.name(code)}")
+    return labels
+
+
+def layout(scale):
+    """Regions and years for `scale` (1 = the size of TAB4824)."""
+    labels = regions()
+    if scale < 1:
+        # Riket plus an even spread of län and kommuner
+        keep = np.linspace(1, len(labels) - 1, max(1, round((len(labels) - 1) * scale))).round()
+        labels = [labels[0]] + [labels[int(i)] for i in keep]
+        n_years = BASE_YEARS
+    else:
+        n_years = max(BASE_YEARS, round(BASE_YEARS * scale))
+    return labels, list(range(LAST_YEAR - n_years + 1, LAST_YEAR + 1))
+
+
+def row_count(scale):
+    labels, years = layout(scale)
+    return len(labels) * len(BACKGROUNDS) * len(AGES) * len(SEXES) * len(years)
+
+
+def write_extract(path, scale=1.0, seed=0):
+    """
+    Write the synthetic extract to `path`, one region at a time so memory
+    stays flat at any scale. Returns the number of data rows.
+    """
+    labels, years = layout(scale)
+    rng = np.random.default_rng(seed)
+    block = len(BACKGROUNDS) * len(AGES) * len(SEXES) * len(years)
+
+    rows = 0
+    with open(path, "w", encoding="iso-8859-1", newline="") as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
+        writer.writerow(HEADER)
+        for region in labels:
+            counts = rng.integers(0, 200, size=block).tolist()
+            keys = itertools.product(BACKGROUNDS, AGES, SEXES, years)
+            writer.writerows((region, background, age, sex, year, count)
+                             for (background, age, sex, year), count in zip(keys, counts))
+            rows += block
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("scale", type=float, nargs="?", default=1.0,
+                        help="Size relative to TAB4824 (default: 1)")
+    parser.add_argument("-o", "--output", type=Path, default=Path("TAB4824_synthetic.csv"),
+                        help="Output CSV (default: TAB4824_synthetic.csv)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = write_extract(args.output, args.scale, args.seed)
+    print(f"Wrote {rows:,} rows ({args.output.stat().st_size / 1e6:.0f} MB) to {args.output}")
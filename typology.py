@@ -0,0 +1,249 @@
+"""
+Working-age typology of kommuner, shared by the Swedish and Danish analyses
+
+Each kommune is put in one of eight mutually exclusive categories from the
+change in its total, native and foreign working-age population. Changes
+between -small and +small are treated as flat (rounding noise).
+
+The categories are assigned with whole-array boolean masks rather than a
+row-by-row function, so a grid of scenarios (years x thresholds x kommuner)
+is classified in a single call:
+
+    codes = classify_codes(total, native, foreign, small=np.array([[50], [100], [200]]))
+"""
+import numpy as np
+import pandas as pd
+
+# Changes within +/- SMALL people count as flat
+SMALL = 100
+
+# Guards the ratios against division by zero
+EPS = 1e-9
+
+# Thresholds of the default sensitivity sweep: people, and percent of population
+SWEEP_ABSOLUTE = (0, 25, 50, 75, 100, 150, 200, 300, 400, 500)
+SWEEP_RELATIVE = (0.25, 0.5, 1, 2)
+
+# Categories in priority order: the first one that applies wins
+TYPOLOGY = [
+    "growth_foreign",
+    "stable_foreign",
+    "dual_growth",
+    "growth_native",
+    "decline",
+    "decline_despite_inflow",
+    "offsetting_churn",
+    "small_change",
+]
+
+# Column names and labels of each country's data
+COUNTRIES = {
+    "se": {
+        "name": "kommun",
+        "geo_name": "kom_namn",
+        "total": "Total",
+        "native": "Swedish",
+        "foreign": "Foreign National",
+        "labels": {
+            "growth_foreign": "Growth driven by people with foreign backgrounds",
+            "stable_foreign": "Stable because of people with foreign backgrounds",
+            "dual_growth": "Dual growth (Swedes + Foreigners)",
+            "growth_native": "Growth driven by Swedes",
+            "decline": "Working age population decline",
+            "decline_despite_inflow": "Decline despite foreign inflow",
+            "offsetting_churn": "Stable: offsetting churn",
+            "small_change": "Small change",
+        },
+    },
+    "dk": {
+        "name": "Kommune",
+        "geo_name": "label_dk",
+        "total": "Total",
+        "native": "Danish",
+        "foreign": "Foreign National",
+        "labels": {
+            "growth_foreign": "Growth driven by foreigners",
+            "stable_foreign": "Stable because of foreigners",
+            "dual_growth": "Dual growth (Danes + Foreigners)",
+            "growth_native": "Growth driven by Danes",
+            "decline": "Working age population decline",
+            "decline_despite_inflow": "Decline despite foreign inflow",
+            "offsetting_churn": "Stable: offsetting churn",
+            "small_change": "Small change",
+        },
+    },
+}
+
+# Colour-blind friendly palette of the typology maps. "offsetting_churn" has
+# no colour of its own and is drawn like missing data.
+TYPOLOGY_COLOURS = {
+    "growth_foreign": "#0B6A55",  # blue
+    "stable_foreign": "#36B0CC",  # light blue
+    "dual_growth": "#1CD194",  # green
+    "growth_native": "#B58A21",  # orange
+    "decline": "#FDA9AF",  # light pink
+    "decline_despite_inflow": "#F9D35A",  # yellow
+    "small_change": "#A3AFAB",  # grey
+}
+
+# Danish labels for forandring.ipynb
+LABELS_DA = {
+    "growth_foreign": "Vækst drevet af udlændinge",
+    "stable_foreign": "Stabil på grund af udlændinge",
+    "dual_growth": "Dobbelt vækst (danskere + udlændinge)",
+    "growth_native": "Vækst drevet af danskere",
+    "decline": "Fald i befolkningen i erhvervsaktiv alder",
+    "decline_despite_inflow": "Fald trods tilstrømning af udlændinge",
+    "offsetting_churn": "Stabil: udlignende forskydninger",
+    "small_change": "Lille ændring",
+}
+
+
+def typology_masks(total, native, foreign, small=SMALL):
+    """
+    Boolean mask of every category but the fallback "small_change", in
+    priority order. Inputs are arrays (or scalars) that broadcast together,
+    so `small` can carry its own axis for a threshold sweep.
+    """
+    total, native, foreign, small = (np.asarray(x) for x in (total, native, foreign, small))
+
+    t_pos, t_neg = total > small, total < -small
+    t_flat = ~t_pos & ~t_neg
+    n_pos, n_neg = native > small, native < -small
+    f_pos, f_neg = foreign > small, foreign < -small
+
+    return {
+        # growth but natives down -> foreigners are the driver
+        "growth_foreign": t_pos & n_neg & f_pos,
+        # total ~flat but foreigners offset the native decline
+        "stable_foreign": t_flat & n_neg & f_pos,
+        "dual_growth": t_pos & n_pos & f_pos,
+        "growth_native": t_pos & n_pos & ~f_pos,
+        "decline": t_neg & n_neg & ~f_pos,
+        "decline_despite_inflow": t_neg & n_neg & f_pos,
+        "offsetting_churn": t_flat & ((n_pos & f_neg) | (n_neg & f_pos)),
+    }
+
+
+def classify_codes(total, native, foreign, small=SMALL):
+    """
+    Typology of every element as an int8 index into TYPOLOGY. The result has
+    the broadcast shape of the inputs.
+    """
+    masks = typology_masks(total, native, foreign, small)
+    return np.select(
+        list(masks.values()),
+        [np.int8(TYPOLOGY.index(key)) for key in masks],
+        default=np.int8(TYPOLOGY.index("small_change")),
+    ).astype(np.int8)
+
+
+def typology_labels(country="dk", labels=None):
+    """Labels in TYPOLOGY order, from `labels` or the country's defaults."""
+    labels = labels or COUNTRIES[country]["labels"]
+    return [labels[key] for key in TYPOLOGY]
+
+
+def classify(df, country="dk", small=SMALL, labels=None):
+    """Typology label of each row of `df`, using the country's column names."""
+    columns = COUNTRIES[country]
+    codes = classify_codes(df[columns["total"]], df[columns["native"]],
+                           df[columns["foreign"]], small)
+    return pd.Series(
+        pd.Categorical.from_codes(codes, typology_labels(country, labels)).astype(str),
+        index=df.index,
+        name="Typology",
+    )
+
+
+def helper_metrics(df, country="dk", small=SMALL):
+    """
+    replacement_ratio: foreign gain per native lost, where natives declined.
+    foreign_share_of_growth: foreign share of total growth, where it grew.
+    """
+    columns = COUNTRIES[country]
+    total, native, foreign = (df[columns[key]] for key in ("total", "native", "foreign"))
+    return pd.DataFrame({
+        "replacement_ratio": np.where(native < -small, foreign / (-native + EPS), np.nan),
+        "foreign_share_of_growth": np.where(total > small, foreign / (total + EPS), np.nan),
+    }, index=df.index)
+
+
+def add_typology(df, country="dk", small=SMALL, labels=None):
+    """
+    Return `df` with numeric change columns (missing values as 0), the
+    helper metrics and a `Typology` column.
+    """
+    columns = COUNTRIES[country]
+    df = df.assign(**{
+        columns[key]: pd.to_numeric(df[columns[key]], errors="coerce").fillna(0)
+        for key in ("total", "native", "foreign")
+    })
+    df = df.join(helper_metrics(df, country, small))
+    df["Typology"] = classify(df, country, small, labels)
+    return df
+
+
+def threshold_grid(population=None, absolute=SWEEP_ABSOLUTE, relative=SWEEP_RELATIVE):
+    """
+    Names and values of the thresholds to sweep. `small` has one row per
+    threshold and one column per kommune: absolute thresholds are the same
+    for every kommune, relative ones are a percentage of its `population`.
+    """
+    names = [f"abs_{value:g}" for value in absolute]
+    rows = [np.full(len(population) if population is not None else 1, float(value))
+            for value in absolute]
+    if relative:
+        if population is None:
+            raise ValueError("Relative thresholds need the population of each kommune")
+        population = np.asarray(population, dtype=float)
+        names += [f"rel_{value:g}%" for value in relative]
+        rows += [population * value / 100 for value in relative]
+    return names, np.vstack(rows)
+
+
+def stability_scores(codes, baseline):
+    """
+    Per kommune (column of `codes`): the modal typology, the share of
+    thresholds giving that typology, the number of distinct typologies and
+    the share of thresholds agreeing with the `baseline` codes.
+    """
+    counts = (codes[..., np.newaxis] == np.arange(len(TYPOLOGY), dtype=np.int8)).sum(axis=0)
+    modal = counts.argmax(axis=1)
+    return {
+        "modal": modal,
+        "stability": counts.max(axis=1) / len(codes),
+        "n_typologies": (counts > 0).sum(axis=1),
+        "baseline_agreement": (codes == baseline).mean(axis=0),
+    }
+
+
+def threshold_sweep(df, country="dk", population=None, absolute=SWEEP_ABSOLUTE,
+                    relative=SWEEP_RELATIVE, small=SMALL, labels=None):
+    """
+    Classify every kommune in `df` at every threshold in one batched call.
+
+    Returns the kommune x threshold matrix of labels (same index as `df`)
+    and a table of stability scores, with `small` as the baseline threshold.
+    """
+    columns = COUNTRIES[country]
+    total, native, foreign = (df[columns[key]].to_numpy(dtype=float)
+                              for key in ("total", "native", "foreign"))
+    names, grid = threshold_grid(population, absolute, relative)
+
+    # One row per threshold, one column per kommune
+    codes = classify_codes(total, native, foreign, grid)
+    baseline = classify_codes(total, native, foreign, small)
+
+    label_names = np.array(typology_labels(country, labels), dtype=object)
+    matrix = pd.DataFrame(label_names[codes.T], index=df.index, columns=names)
+
+    scores = stability_scores(codes, baseline)
+    stability = pd.DataFrame({
+        "baseline": label_names[baseline],
+        "modal": label_names[scores["modal"]],
+        "stability": scores["stability"],
+        "n_typologies": scores["n_typologies"],
+        "baseline_agreement": scores["baseline_agreement"],
+    }, index=df.index)
+    return matrix, stability
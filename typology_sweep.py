@@ -0,0 +1,138 @@
+"""
+Sensitivity of the kommune typology to the SMALL noise band
+
+Classifies every Swedish or Danish kommune at a whole range of thresholds,
+absolute (people) and relative (percent of the kommune's population), in one
+batched computation. Writes the kommune x threshold label matrix and a
+stability score per kommune:
+
+    python typology_sweep.py se
+    python typology_sweep.py dk --absolute 50 100 200 --relative 1
+"""
+import argparse
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from clean_statbank import INPUTS, clean_input
+from municipalities import danish_index, swedish_index
+from typology import COUNTRIES, SMALL, SWEEP_ABSOLUTE, SWEEP_RELATIVE, threshold_sweep
+
+ROOT = Path(__file__).resolve().parent
+
+# Change files behind the notebooks' df_all, one per typology column
+CHANGE_FILES = {
+    "se": {
+        "total": ROOT / "sweden" / "raw" / "change_clean.csv",
+        "native": ROOT / "sweden" / "raw" / "change_swedes_clean.csv",
+        "foreign": ROOT / "sweden" / "raw" / "change_foreign_clean.csv",
+    },
+    "dk": {
+        "total": ROOT / "raw" / "change_since_pandemic_clean.csv",
+        "native": ROOT / "raw" / "change_danish.csv",
+        "foreign": ROOT / "raw" / "foreign_national_change.csv",
+    },
+}
+
+# Population used for relative thresholds (end year of the change)
+SE_POPULATION = ROOT / "sweden" / "raw" / "scb_clean.csv"
+SE_POPULATION_YEAR = 2024
+DK_POPULATION = ROOT / "raw" / "kommuner 2008 2025.csv"
+DK_POPULATION_PERIOD = "2025Q3"
+
+INDEXES = {"se": swedish_index, "dk": danish_index}
+
+
+def read_change_file(path, country):
+    """A two-column (name, change) CSV as a Series indexed by kommun code."""
+    path = Path(path)
+    df = pd.read_csv(path, encoding="utf-8")
+    name_col, value_col = df.columns[:2]
+    df = INDEXES[country]().attach_codes(df, name_col, label=path.name)
+    return df.dropna(subset=["kommun_code"]).set_index("kommun_code")[value_col]
+
+
+def load_changes(country):
+    """
+    The country's change table (name, Total, native, Foreign National),
+    indexed by kommun code.
+    """
+    columns = COUNTRIES[country]
+    index = INDEXES[country]()
+    frames = [read_change_file(path, country).rename(columns[key])
+              for key, path in CHANGE_FILES[country].items()]
+
+    changes = pd.concat(frames, axis=1, join="inner").fillna(0)
+    changes.insert(0, columns["name"], [index.name(code) for code in changes.index])
+    return changes
+
+
+def swedish_population(path=SE_POPULATION, year=SE_POPULATION_YEAR):
+    """Population per kommun code from the cleaned SCB table."""
+    clean = pd.read_csv(path, encoding="utf-8")
+    rows = clean[(clean["input"] == "population") & (clean["level"] == "kommun")
+                 & (clean["year"] == year)]
+    return rows.set_index("kommun_code")["value"]
+
+
+def danish_population(path=DK_POPULATION, period=DK_POPULATION_PERIOD):
+    """Population per kommune code from the StatBank export (clean_statbank.py)."""
+    spec = dict(INPUTS["population"], file=Path(path).name)
+    clean = clean_input("population", spec, Path(path).parent)
+    rows = clean[(clean["level"] == "kommune") & (clean["period"] == period)]
+    return rows.set_index("kommun_code")["value"]
+
+
+POPULATION = {"se": swedish_population, "dk": danish_population}
+
+
+def sweep(country, absolute=SWEEP_ABSOLUTE, relative=SWEEP_RELATIVE, small=SMALL):
+    """Load the country's data and run the sweep. Returns (changes, matrix, stability)."""
+    changes = load_changes(country)
+    population = None
+    if relative:
+        population = POPULATION[country]().reindex(changes.index)
+        missing = population.isna()
+        if missing.any():
+            print(f"No population for {missing.sum()} kommuner; "
+                  f"relative thresholds treat them as 0")
+        population = population.fillna(0)
+
+    start = time.perf_counter()
+    matrix, stability = threshold_sweep(changes, country, population, absolute, relative, small)
+    elapsed = time.perf_counter() - start
+
+    name_col = COUNTRIES[country]["name"]
+    matrix.insert(0, name_col, changes[name_col])
+    stability.insert(0, name_col, changes[name_col])
+    print(f"Classified {len(changes)} kommuner at {matrix.shape[1] - 1} thresholds "
+          f"in {elapsed * 1000:.1f} ms")
+    return changes, matrix, stability
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("country", choices=list(COUNTRIES))
+    parser.add_argument("--absolute", nargs="*", type=float, default=list(SWEEP_ABSOLUTE),
+                        help="Thresholds in people (default: %(default)s)")
+    parser.add_argument("--relative", nargs="*", type=float, default=list(SWEEP_RELATIVE),
+                        help="Thresholds in percent of population (default: %(default)s)")
+    parser.add_argument("--small", type=float, default=SMALL,
+                        help="Baseline threshold for the agreement score (default: %(default)s)")
+    parser.add_argument("-o", "--output-dir", type=Path, default=Path("."),
+                        help="Where to write the CSVs (default: current directory)")
+    args = parser.parse_args()
+
+    changes, matrix, stability = sweep(args.country, args.absolute, args.relative, args.small)
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    matrix_path = args.output_dir / f"typology_sweep_{args.country}.csv"
+    stability_path = args.output_dir / f"typology_stability_{args.country}.csv"
+    matrix.to_csv(matrix_path, encoding="utf-8")
+    stability.to_csv(stability_path, encoding="utf-8")
+    print(f"Saved {matrix_path} and {stability_path}")
+
+    unstable = stability.sort_values("stability").head(10)
+    print("\nLeast stable kommuner:")
+    print(unstable.to_string())